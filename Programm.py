@@ -1,23 +1,314 @@
+import time
+
+STARTED = time.perf_counter()  # Начало запуска: засекаем до импорта остальных модулей
+
 import sqlite3
 from datetime import datetime
 import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-import clipboard
+from tkinter import ttk, messagebox, filedialog, simpledialog
+import bisect
+import json
 import os
+import queue
+import sys
+import threading
+
+from parts_backup import restore_snapshot, snapshot_dir, write_snapshot
+from parts_client import DEFAULT_PORT, RemoteRepository, is_server_url
+from parts_export import export_file
+from parts_import import clipboard_records, clipboard_text, import_file, parse_records
+from parts_profiler import PROFILER, SLOW_LOG_PATH, SLOW_OPERATION_MS
+from parts_repository import (MAINTENANCE_INTERVAL, MOVEMENT_KINDS, PAGE_SIZE, PART_COLUMNS, SORT_COLUMNS,
+                              ConflictError, PartsRepository, timestamp)
+
+IMPORTED = time.perf_counter()  # Модули загружены; clipboard импортируется при первом обращении к буферу
+
+MAX_LOADED_ROWS = PAGE_SIZE * 5  # Сколько строк одновременно держим в таблице
+SCROLL_PREFETCH = 0.1  # Доля прокрутки у края окна, при которой грузим соседнюю страницу
+PASTE_PREVIEW_ROWS = 500  # Сколько вставляемых строк показываем в окне подтверждения
+WORKER_POLL_MS = 30  # Как часто интерфейс забирает готовые результаты фонового потока
+SEARCH_DEBOUNCE_MS = 250  # Пауза в наборе, после которой запускается поиск
+CHANGE_POLL_MS = 2000  # Как часто проверяем, не изменили ли базу другие пользователи
+SETTINGS_PATH = os.path.join(os.path.expanduser("~"), ".parts_app.json")  # Недавние базы и замеры запуска
+RECENT_LIMIT = 8  # Сколько недавних баз помним
+STARTUP_HISTORY = 20  # Сколько последних замеров запуска храним в настройках
+SKELETON_ROWS = 25  # Строк-заглушек, которые видны, пока не пришла первая страница
+STATS_REFRESH_MS = 1000  # Как часто окно статистики перечитывает замеры
+
+
+def load_settings():
+    """Настройки программы из SETTINGS_PATH; при любой ошибке — пустые"""
+    try:
+        with open(SETTINGS_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_settings(settings):
+    try:
+        with open(SETTINGS_PATH, 'w', encoding='utf-8') as f:
+            json.dump(settings, f, ensure_ascii=False, indent=2)
+    except OSError:
+        pass  # Без сохраненных настроек программа работает как раньше
+
+
+def import_clipboard():
+    """Модуль clipboard; импортируется при первом обращении к буферу, а не при запуске"""
+    import clipboard
+    return clipboard
+
+
+def parse_date(text):
+    """Проверяет дату в формате ГГГГ-ММ-ДД, в котором хранится date_added"""
+    datetime.strptime(text, "%Y-%m-%d")
+    return text
+
+
+def format_money(value):
+    """Сумма с пробелами между разрядами: 1 234 567.89"""
+    return f"{value:,.2f}".replace(',', ' ')
+
+
+def result_rows(value):
+    """Сколько строк вернул запрос к базе: список строк или (страница, ...)"""
+    if isinstance(value, list):
+        return len(value)
+    if isinstance(value, tuple) and value and isinstance(value[0], list):
+        return len(value[0])
+    return None
+
+
+def display_values(row):
+    """Значения строки для таблицы: NULL показываем пустой ячейкой, а не 'None'"""
+    return ['' if value is None else value for value in row]
+
+
+class TaskCancelled(Exception):
+    """Прерывает задачу, которую отменили, пока она выполнялась"""
+
+    def __init__(self):
+        super().__init__("операция отменена")
+
+
+class DatabaseTask:
+    """Запрос к базе, поставленный в очередь DatabaseWorker"""
+
+    def __init__(self, worker, job, args, description, on_done, on_error, with_progress, quiet, writes):
+        self.worker = worker
+        # Имя метода хранилища или функция; вызывается в фоновом потоке
+        # как repository.job(*args) или job(repository, *args)
+        self.job = job
+        self.args = args
+        self.description = description
+        self.on_done = on_done
+        self.on_error = on_error
+        self.with_progress = with_progress  # Передавать ли в job аргумент progress=self.report
+        self.quiet = quiet  # Фоновая проверка, которую не показываем в строке состояния
+        self.writes = writes  # Меняет базу или файлы: результат нужен интерфейсу и после отмены
+        self.status = None  # Последний отчет о ходе работы: (текст, доля от 0 до 1 или None)
+        self.cancelled = False
+        self.submitted = time.perf_counter()  # Для замера ожидания в очереди
+
+    def cancel(self):
+        self.worker.cancel(self)
+
+    def report(self, text, fraction=None):
+        """Сообщает из фонового потока о ходе работы; у отмененной задачи прерывает ее"""
+        if self.cancelled:
+            raise TaskCancelled()
+        self.worker.results.put((self, 'progress', (text, fraction)))
+
+
+class DatabaseWorker:
+    """Фоновый поток, который владеет хранилищем PartsRepository и выполняет все запросы.
+
+    Задачи ставятся в очередь из потока Tk, а их результаты забираются оттуда же
+    через root.after, поэтому обработчики on_done/on_error могут работать с виджетами.
+    """
+
+    def __init__(self, root, on_change=None):
+        self.root = root
+        self.on_change = on_change  # Вызывается при изменении списка активных задач
+        self.repository = None
+        self.tasks = queue.Queue()
+        self.results = queue.Queue()
+        self.active = []  # Задачи, результат которых еще не передан в интерфейс
+        self.current = None  # Задача, выполняющаяся прямо сейчас
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name="database", daemon=True)
+        self.thread.start()
+        self.root.after(WORKER_POLL_MS, self.poll)
+
+    def submit(self, job, *args, description="Запрос к базе", on_done=None, on_error=None,
+               with_progress=False, quiet=False, writes=False):
+        """Ставит в очередь вызов метода хранилища с именем job (или функции
+        job(repository, *args)) и возвращает задачу для отмены.
+
+        Долгим задачам с with_progress=True передается еще progress(текст, доля):
+        отчеты показываются в строке состояния, а после отмены вызов progress
+        прерывает задачу. Задачи с quiet=True в строке состояния не показываются.
+
+        Результат отмененного чтения отбрасывается. Задача с writes=True сообщает
+        итог и после отмены: изменения могли успеть зафиксироваться, и окно
+        должно их показать; не начатая задача завершается ошибкой TaskCancelled.
+        """
+        task = DatabaseTask(self, job, args, description, on_done, on_error, with_progress, quiet, writes)
+        self.active.append(task)
+        self.tasks.put(task)
+        self.notify()
+        return task
+
+    def open(self, path, **callbacks):
+        """Переключает поток на базу path, закрывая прежнее соединение"""
+        return self.submit(self.reconnect, path, description="Открытие базы", writes=True, **callbacks)
+
+    def reconnect(self, repository, path):
+        """Открывает файл базы или подключается к серверу, если path — адрес http://"""
+        if is_server_url(path):
+            new_repository = RemoteRepository.open(path)
+        else:
+            new_repository = PartsRepository.open(path)
+        with self.lock:
+            # Открытие отменили, пока оно шло: окно осталось на прежней базе, и поток тоже
+            if self.current.cancelled:
+                new_repository.close()
+                raise TaskCancelled()
+            self.repository = new_repository
+        if repository:
+            repository.close()
+
+    def cancel(self, task):
+        """Отменяет задачу; если она уже выполняется, прерывает ее запрос"""
+        with self.lock:
+            task.cancelled = True
+            if self.current is task and self.repository:
+                self.repository.interrupt()
+        if task in self.active:
+            self.active.remove(task)
+            self.notify()
+
+    def cancel_all(self):
+        for task in list(self.active):
+            self.cancel(task)
+
+    def close(self):
+        """Останавливает поток и закрывает соединение"""
+        self.cancel_all()
+        self.tasks.put(None)
+        self.thread.join(timeout=5)
+
+    def run(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            with self.lock:
+                if task.cancelled:
+                    if task.writes:
+                        self.results.put((task, 'error', TaskCancelled()))
+                    continue
+                self.current = task
+            kwargs = {'progress': task.report} if task.with_progress else {}
+            if isinstance(task.job, str):
+                job, args = getattr(self.repository, task.job), task.args
+            else:
+                job, args = task.job, (self.repository, *task.args)
+            started = time.perf_counter()
+            try:
+                kind, value = 'done', job(*args, **kwargs)
+            except Exception as e:
+                kind, value = 'error', e
+            with self.lock:
+                self.current = None
+            if PROFILER.enabled:
+                PROFILER.record(f"Очередь: {task.description}", started - task.submitted)
+                PROFILER.record(f"База: {getattr(job, '__name__', task.description)}",
+                                time.perf_counter() - started, result_rows(value))
+            self.results.put((task, kind, value))
+        if self.repository:
+            self.repository.close()
+
+    def poll(self):
+        """Передает готовые результаты обработчикам в потоке Tk"""
+        # Планируем следующий опрос заранее: обработчик может открыть модальный диалог
+        self.root.after(WORKER_POLL_MS, self.poll)
+        while True:
+            try:
+                task, kind, value = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if task.cancelled and (kind == 'progress' or not task.writes):
+                continue
+            if kind == 'progress':
+                task.status = value
+                self.notify()
+                continue
+            if task in self.active:
+                self.active.remove(task)
+                self.notify()
+            if kind == 'done':
+                if task.on_done:
+                    task.on_done(value)
+            elif task.on_error:
+                task.on_error(value)
+            elif not isinstance(value, TaskCancelled):
+                messagebox.showerror("Ошибка БД", str(value))
+
+    def notify(self):
+        if self.on_change:
+            self.on_change()
 
 
 class ImprovedPartsApp:
-    def __init__(self, root):
+    def __init__(self, root, startup_report=False, profile=False):
         self.root = root
         self.root.title("Учет запчастей")
         self.root.geometry("1400x700")
 
         self.current_db = None  # Текущая база данных
+        self.search_term = None
+        self.search_ranked = False  # Выдача поиска отсортирована по релевантности
+        self.sort_column = 'id'  # Поле, по которому база сортирует таблицу
+        self.sort_descending = False
+        self.filters = {}  # Фильтры по столбцам: имя из FILTERS -> значение
+        self.first_key = self.last_key = None  # Границы загруженного окна строк
+        self.item_keys = {}  # Строка таблицы (ее iid — id записи) -> ключ пагинации
+        self.has_prev_page = self.has_next_page = False
+        self.page_task = None  # Загрузка страницы, которая еще не пришла из фонового потока
+        self.replace_rows = False  # Первая страница новой выдачи заменит строки таблицы
+        self.search_after = None  # Отложенный поиск по набранному тексту (id таймера after)
+        self.change_counter = 0  # Версия базы, до которой видны изменения других пользователей
+        self.changes_task = None  # Проверка изменений, которая еще не вернулась
+        self.settings = load_settings()
+        self.skeleton_items = []  # Строки-заглушки до прихода первой страницы
+        self.startup_pending = False  # Ждем первую строку последней базы, чтобы замерить запуск
+        self.startup_report = startup_report  # Напечатать замер запуска и выйти (--startup-time)
+        self.ready_text = "Готово"  # Строка состояния, когда фоновый поток свободен
+        # Профилирование (parts_profiler.py) включается флагом --profile или в меню «Сервис»
+        self.profile_var = tk.BooleanVar(value=profile or self.settings.get('profile', False))
+        PROFILER.enable(self.profile_var.get())
         self.create_widgets()
         self.setup_context_menu()
-
-        # При запуске программы предлагаем создать или открыть базу данных
-        self.prompt_create_or_open_db()
+        # Все запросы к базе выполняются в отдельном потоке, чтобы окно не зависало
+        self.worker = DatabaseWorker(self.root, on_change=self.update_status)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after(CHANGE_POLL_MS, self.poll_changes)
+        self.root.after(MAINTENANCE_INTERVAL * 1000, self.run_maintenance)
+
+        # Последнюю базу открываем сразу, без вопроса; окно тем временем уже
+        # показывает заглушки строк. Если базы нет, спрашиваем, когда окно отрисуется
+        recent = self.settings.get('recent', [])
+        if recent and (is_server_url(recent[0]) or os.path.exists(recent[0])):
+            self.startup_pending = True
+            self.show_skeleton()
+            self.open_source(recent[0], error_message="Не удалось открыть последнюю базу",
+                             on_error=self.on_close if startup_report else self.prompt_create_or_open_db)
+        elif startup_report:
+            print("Нет недавней базы: замерять нечего", file=sys.stderr)
+            self.root.after_idle(self.on_close)
+        else:
+            self.root.after_idle(self.prompt_create_or_open_db)
 
     def save_part(self, values):
         """Сохраняет запчасть в базу данных"""
@@ -25,20 +316,16 @@ class ImprovedPartsApp:
             messagebox.showwarning("Ошибка", "Сначала создайте или откройте базу данных")
             return
 
-        conn = sqlite3.connect(self.current_db)
-        cursor = conn.cursor()
-        try:
-            cursor.execute('''
-                INSERT INTO parts (name, part_number, quantity, price, supplier, description, date_added)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', values)
-            conn.commit()
+        def done(row):
+            self.insert_row(row)  # Добавляем в таблицу только новую строку
+            self.refresh_dashboard()
             messagebox.showinfo("Успех", "Запчасть успешно добавлена")
-        except sqlite3.Error as e:
+
+        def failed(e):
             messagebox.showerror("Ошибка БД", f"Не удалось добавить запчасть: {str(e)}")
-        finally:
-            conn.close()
-        self.load_data()  # Обновляем таблицу после добавления
+
+        self.worker.submit('add', values, description="Добавление запчасти",
+                           writes=True, on_done=done, on_error=failed)
 
     def search_parts(self):
         """Поиск запчастей по введенному тексту"""
@@ -48,6 +335,20 @@ class ImprovedPartsApp:
         else:
             self.load_data()
 
+    def schedule_search(self, event=None):
+        """Откладывает поиск до паузы в наборе, чтобы не искать на каждую букву"""
+        if self.search_after:
+            self.root.after_cancel(self.search_after)
+        self.search_after = self.root.after(SEARCH_DEBOUNCE_MS, self.live_search)
+
+    def live_search(self):
+        """Ищет набранный текст, если он изменился с прошлого поиска"""
+        self.search_after = None
+        search_term = self.search_entry.get().strip() or None
+        if self.current_db and search_term != self.search_term:
+            # load_data отменит еще не завершенный поиск по прежнему тексту
+            self.load_data(search_term)
+
     def prompt_create_or_open_db(self):
         """Предлагает пользователю создать новую базу данных или открыть существующую"""
         choice = messagebox.askyesnocancel(
@@ -55,7 +356,7 @@ class ImprovedPartsApp:
             "Открыть существующую базу данных? (Нет — создать новую)"
         )
         if choice is None:  # Пользователь нажал "Отмена"
-            self.root.destroy()
+            self.on_close()
         elif choice:  # Пользователь выбрал "Открыть"
             self.open_database()
         else:  # Пользователь выбрал "Создать"
@@ -64,65 +365,89 @@ class ImprovedPartsApp:
     def create_db(self):
         """Создает новую базу данных, если она не существует"""
         if self.current_db and not os.path.exists(self.current_db):
-            conn = sqlite3.connect(self.current_db)
-            cursor = conn.cursor()
-            try:
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS parts (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        name TEXT NOT NULL,
-                        part_number TEXT UNIQUE,
-                        quantity INTEGER,
-                        price REAL,
-                        supplier TEXT,
-                        description TEXT,
-                        date_added TEXT
-                    )
-                ''')
-                conn.commit()
-            except sqlite3.Error as e:
-                messagebox.showerror("Ошибка БД", str(e))
-            finally:
-                conn.close()
+            self.worker.open(self.current_db)
+
+    def on_close(self):
+        """Останавливает фоновый поток и закрывает соединение при выходе из программы"""
+        self.worker.close()
+        self.root.destroy()
+
+    def selected_items(self):
+        """Выбранные строки таблицы без строк-заглушек; iid строк — это id записей"""
+        return [item for item in self.tree.selection() if item not in self.skeleton_items]
 
     def delete_part(self):
-        """Удаляет выбранную запчасть из базы данных"""
-        selected = self.tree.selection()
-        if not selected:
+        """Удаляет выбранные запчасти из базы данных"""
+        part_ids = self.selected_items()
+        if not part_ids:
             messagebox.showwarning("Ошибка", "Выберите запчасть для удаления")
             return
 
-        part_id = self.tree.item(selected[0], 'values')[0]  # Получаем ID выбранной записи
+        if len(part_ids) == 1:
+            question = "Вы уверены, что хотите удалить эту запчасть?"
+        else:
+            question = f"Вы уверены, что хотите удалить выбранные запчасти ({len(part_ids)} шт.)?"
+        if messagebox.askyesno("Подтверждение", question):
+            def done(_):
+                self.remove_rows(part_ids)  # Убираем из таблицы только удаленные строки
+                self.refresh_dashboard()
+                if len(part_ids) == 1:
+                    messagebox.showinfo("Успех", "Запчасть успешно удалена")
+                else:
+                    messagebox.showinfo("Успех", f"Удалено запчастей: {len(part_ids)}")
 
-        if messagebox.askyesno("Подтверждение", "Вы уверены, что хотите удалить эту запчасть?"):
-            conn = sqlite3.connect(self.current_db)
-            cursor = conn.cursor()
-            try:
-                cursor.execute('DELETE FROM parts WHERE id = ?', (part_id,))
-                conn.commit()
-                messagebox.showinfo("Успех", "Запчасть успешно удалена")
-            except sqlite3.Error as e:
+            def failed(e):
                 messagebox.showerror("Ошибка БД", f"Не удалось удалить запчасть: {str(e)}")
-            finally:
-                conn.close()
-            self.load_data()  # Обновляем таблицу после удаления
+
+            self.worker.submit('delete', part_ids, description="Удаление запчастей",
+                               writes=True, on_done=done, on_error=failed)
 
     def paste_row(self, event=None):
+        """Вставляет строки из буфера обмена (например, блок, скопированный из Excel)"""
+        if not self.current_db:
+            messagebox.showwarning("Ошибка", "Сначала создайте или откройте базу данных")
+            return
+
         try:
-            pasted_data = (clipboard.paste() or self.root.clipboard_get()).split('\t')
-
-            if len(pasted_data) >= 7:
-                # Обработка числовых полей
-                pasted_data[2] = int(float(pasted_data[2]))  # quantity
-                pasted_data[3] = float(pasted_data[3])  # price
-
-                dialog = AddEditDialog(self.root, pasted_data)
-                self.root.wait_window(dialog.top)
-                if dialog.values:
-                    self.save_part(dialog.values)
-                    self.load_data()
+            text = import_clipboard().paste() or self.root.clipboard_get()
         except Exception as e:
-            messagebox.showerror("Ошибка вставки", f"Некорректные данные: {str(e)}")
+            messagebox.showerror("Ошибка вставки", f"Не удалось прочитать буфер обмена: {str(e)}")
+            return
+
+        date_added = timestamp()
+        rejected = []
+        rows = [values for values, _ in parse_records(clipboard_records(text), date_added, rejected)]
+        if not rows:
+            reasons = "\n".join(f"Строка {number}: {reason}" for number, reason in rejected[:10])
+            messagebox.showerror("Ошибка вставки", f"Некорректные данные:\n{reasons}")
+            return
+
+        if len(rows) == 1 and not rejected:
+            # Одну строку, как и раньше, даем поправить перед сохранением
+            dialog = AddEditDialog(self.root, (None, *rows[0]))
+            self.root.wait_window(dialog.top)
+            if dialog.values:
+                self.save_part(dialog.values)
+            return
+
+        dialog = PastePreviewDialog(self.root, rows, rejected)
+        self.root.wait_window(dialog.top)
+        if not dialog.confirmed:
+            return
+
+        def done(counts):
+            inserted, existing = counts
+            self.load_data(self.search_term)
+            self.refresh_suppliers()
+            self.refresh_dashboard()
+            action = "обновлено" if dialog.update_existing else "пропущено"
+            messagebox.showinfo("Успех", f"Добавлено: {inserted}, {action} существующих: {existing}")
+
+        def failed(e):
+            messagebox.showerror("Ошибка БД", f"Не удалось вставить строки: {str(e)}")
+
+        self.worker.submit('insert_many', rows, dialog.update_existing,
+                           description="Вставка строк", writes=True, on_done=done, on_error=failed)
 
     def copy_search_text(self, event=None):
         text = self.search_entry.get()
@@ -130,13 +455,13 @@ class ImprovedPartsApp:
             try:
                 self.root.clipboard_clear()
                 self.root.clipboard_append(text)
-                clipboard.copy(text)
+                import_clipboard().copy(text)
             except Exception as e:
                 messagebox.showerror("Ошибка", f"Не удалось скопировать: {str(e)}")
 
     def paste_to_search(self, event=None):
         try:
-            text = clipboard.paste() or self.root.clipboard_get()
+            text = import_clipboard().paste() or self.root.clipboard_get()
             if text:
                 self.search_entry.delete(0, tk.END)
                 self.search_entry.insert(0, text)
@@ -145,64 +470,184 @@ class ImprovedPartsApp:
             messagebox.showerror("Ошибка", f"Не удалось вставить: {str(e)}")
 
     def copy_row(self, event=None):
-        selected = self.tree.selection()
+        """Копирует выбранные строки в буфер обмена: поля через Tab, строки через перевод строки"""
+        selected = sorted(self.selected_items(), key=self.tree.index)
         if selected:
             try:
-                values = self.tree.item(selected[0], 'values')
-                text = '\t'.join(map(str, values))
+                # Описание с переводами строк берется в кавычки, и вставка разберет строку целиком
+                text = clipboard_text(self.tree.item(item, 'values') for item in selected)
 
                 self.root.clipboard_clear()
                 self.root.clipboard_append(text)
-                clipboard.copy(text)
+                import_clipboard().copy(text)
             except Exception as e:
                 messagebox.showerror("Ошибка копирования", str(e))
 
     def edit_part(self):
-        """Редактирует выбранную запчасть"""
-        selected = self.tree.selection()
+        """Редактирует выбранную запчасть или сразу все выбранные"""
+        selected = self.selected_items()
         if not selected:
             messagebox.showwarning("Ошибка", "Выберите запчасть для редактирования")
             return
+        if len(selected) > 1:
+            self.bulk_edit_parts(selected)
+            return
 
         part_id = self.tree.item(selected[0], 'values')[0]  # Получаем ID выбранной записи
 
-        conn = sqlite3.connect(self.current_db)
-        cursor = conn.cursor()
-        try:
-            cursor.execute('SELECT * FROM parts WHERE id = ?', (part_id,))
-            part = cursor.fetchone()
+        def done(result):
+            if result is None:
+                self.remove_rows([str(part_id)])
+                messagebox.showwarning("Ошибка", "Запчасть удалена другим пользователем")
+                return
+            part, version = result
             dialog = AddEditDialog(self.root, part)
             self.root.wait_window(dialog.top)
             if dialog.values:
-                self.update_part(part_id, dialog.values)
-        except sqlite3.Error as e:
+                # У старых записей остаток бывает NULL: в окне он пустой, то есть 0, и введенное
+                # количество должно записаться корректировкой
+                self.update_part(part_id, dialog.values, part[3] or 0, version)
+
+        def failed(e):
             messagebox.showerror("Ошибка БД", f"Не удалось загрузить данные: {str(e)}")
-        finally:
-            conn.close()
 
-    def update_part(self, part_id, values):
-        """Обновляет запчасть в базе данных"""
-        conn = sqlite3.connect(self.current_db)
-        try:
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE parts SET
-                    name = ?,
-                    part_number = ?,
-                    quantity = ?,
-                    price = ?,
-                    supplier = ?,
-                    description = ?,
-                    date_added = ?
-                WHERE id = ?
-            ''', (*values, part_id))
-            conn.commit()
-            self.load_data()
+        self.worker.submit('get_versioned', part_id, description="Загрузка запчасти",
+                           on_done=done, on_error=failed)
+
+    def bulk_edit_parts(self, part_ids):
+        """Меняет заданные поля у всех выбранных запчастей одним запросом"""
+        dialog = BulkEditDialog(self.root, len(part_ids))
+        self.root.wait_window(dialog.top)
+        if not dialog.changes:
+            return
+
+        def done(rows):
+            for row in rows:
+                self.refresh_row(row)
+            self.refresh_dashboard()
+            messagebox.showinfo("Успех", f"Изменено запчастей: {len(rows)}")
+
+        def failed(e):
+            messagebox.showerror("Ошибка БД", f"Не удалось сохранить изменения: {str(e)}")
+
+        self.worker.submit('update_fields', part_ids, dialog.changes,
+                           description="Изменение запчастей", writes=True, on_done=done, on_error=failed)
+
+    def update_part(self, part_id, values, shown_quantity, version=None):
+        """Обновляет запчасть в базе данных; изменение остатка записывается корректировкой.
+
+        Запись сохраняется, только если с чтения version ее никто не изменил;
+        иначе пользователь видит текущую запись и решает, перезаписать ли ее.
+        """
+        def done(row):
+            self.refresh_row(row)
+            self.refresh_dashboard()
             messagebox.showinfo("Успех", "Изменения сохранены")
-        except sqlite3.IntegrityError:
-            messagebox.showerror("Ошибка", "Артикул должен быть уникальным!")
-        finally:
-            conn.close()
+
+        def failed(e):
+            if isinstance(e, ConflictError):
+                self.resolve_conflict(part_id, values, shown_quantity, e)
+            elif isinstance(e, sqlite3.IntegrityError):
+                messagebox.showerror("Ошибка", "Артикул должен быть уникальным!")
+            else:
+                messagebox.showerror("Ошибка БД", f"Не удалось сохранить изменения: {str(e)}")
+
+        self.worker.submit('update', part_id, values, shown_quantity, version,
+                           description="Сохранение изменений", writes=True, on_done=done, on_error=failed)
+
+    def resolve_conflict(self, part_id, values, shown_quantity, conflict):
+        """Показывает запись, измененную другим пользователем, и предлагает перезаписать ее"""
+        if conflict.current is None:
+            self.remove_rows([str(part_id)])
+            messagebox.showerror("Конфликт", "Запчасть удалена другим пользователем, изменения не сохранены")
+            return
+        self.refresh_row(conflict.current)
+        current = "\n".join(
+            f"{title}: {'' if value is None else value}"
+            for title, value in zip(("Название", "Артикул", "Количество", "Цена", "Поставщик", "Описание"),
+                                    conflict.current[1:7])
+        )
+        if messagebox.askyesno(
+            "Конфликт",
+            "Пока окно было открыто, запчасть изменил другой пользователь. Сейчас в базе:\n\n"
+            f"{current}\n\nЗаписать поверх ваши изменения?"
+        ):
+            self.update_part(part_id, values, shown_quantity, conflict.version)
+
+    def selected_part_id(self, action):
+        """id единственной выбранной запчасти или None с предупреждением"""
+        selected = self.selected_items()
+        if len(selected) != 1:
+            messagebox.showwarning("Ошибка", f"Выберите одну запчасть для операции «{action}»")
+            return None
+        return int(selected[0])
+
+    def receive_part(self):
+        self.move_stock('receipt')
+
+    def issue_part(self):
+        self.move_stock('issue')
+
+    def move_stock(self, kind):
+        """Записывает приход или расход выбранной запчасти одной строкой журнала"""
+        part_id = self.selected_part_id(MOVEMENT_KINDS[kind])
+        if part_id is None:
+            return
+        values = self.tree.item(part_id, 'values')
+        dialog = StockMovementDialog(self.root, kind, values[1], values[3])
+        self.root.wait_window(dialog.top)
+        if not dialog.quantity:
+            return
+
+        def done(row):
+            self.refresh_row(row)
+            self.refresh_dashboard()
+
+        def failed(e):
+            messagebox.showerror("Ошибка", f"Не удалось записать движение: {str(e)}")
+
+        self.worker.submit('record_movement', part_id, kind, dialog.quantity, dialog.reason,
+                           description=MOVEMENT_KINDS[kind], writes=True, on_done=done, on_error=failed)
+
+    def set_min_quantity(self):
+        """Задает выбранным запчастям порог остатка для списка заканчивающихся"""
+        part_ids = self.selected_items()
+        if not part_ids:
+            messagebox.showwarning("Ошибка", "Выберите запчасти")
+            return
+        value = simpledialog.askstring(
+            "Минимальный остаток",
+            f"Минимальный остаток для выбранных запчастей ({len(part_ids)} шт.),\n"
+            "пустое поле — не отслеживать:",
+            parent=self.root
+        )
+        if value is None:
+            return
+        value = value.strip()
+        if value and not value.isdigit():
+            messagebox.showerror("Ошибка", "Минимальный остаток должен быть целым неотрицательным числом")
+            return
+
+        def failed(e):
+            messagebox.showerror("Ошибка БД", f"Не удалось сохранить порог: {str(e)}")
+
+        self.worker.submit('set_min_quantity', part_ids, int(value) if value else None,
+                           description="Минимальный остаток",
+                           writes=True, on_done=lambda _: self.refresh_dashboard(), on_error=failed)
+
+    def show_movements(self):
+        """Показывает журнал движения остатка выбранной запчасти"""
+        part_id = self.selected_part_id("История движения")
+        if part_id is None:
+            return
+        name = self.tree.item(part_id, 'values')[1]
+
+        def failed(e):
+            messagebox.showerror("Ошибка БД", f"Не удалось загрузить историю: {str(e)}")
+
+        self.worker.submit('movements', part_id, description="Загрузка истории",
+                           on_done=lambda rows: MovementHistoryDialog(self, part_id, name, rows),
+                           on_error=failed)
 
     def create_widgets(self):
         # Меню
@@ -210,7 +655,25 @@ class ImprovedPartsApp:
         filemenu = tk.Menu(menubar, tearoff=0)
         filemenu.add_command(label="Открыть", command=self.open_database)
         filemenu.add_command(label="Сохранить как...", command=self.save_database_as)
+        filemenu.add_command(label="Подключиться к серверу...", command=self.connect_server)
+        self.recent_menu = tk.Menu(filemenu, tearoff=0)
+        filemenu.add_cascade(label="Недавние базы", menu=self.recent_menu)
+        self.update_recent_menu()
+        filemenu.add_separator()
+        filemenu.add_command(label="Импорт из CSV/XLSX...", command=self.import_file)
+        filemenu.add_command(label="Экспорт...", command=self.export_file)
         menubar.add_cascade(label="Файл", menu=filemenu)
+        toolsmenu = tk.Menu(menubar, tearoff=0)
+        toolsmenu.add_checkbutton(label="Профилирование", variable=self.profile_var, command=self.toggle_profiling)
+        toolsmenu.add_command(label="Статистика запросов...", command=lambda: ProfilerStatsDialog(self.root))
+        toolsmenu.add_separator()
+        toolsmenu.add_command(label="Резервная копия...", command=self.backup_database)
+        toolsmenu.add_command(label="Снимок базы", command=self.snapshot_database)
+        toolsmenu.add_command(label="Восстановить из снимка...", command=self.restore_database)
+        toolsmenu.add_separator()
+        toolsmenu.add_command(label="Обновить статистику (ANALYZE)", command=self.analyze_database)
+        toolsmenu.add_command(label="Сжать базу (VACUUM)", command=self.vacuum_database)
+        menubar.add_cascade(label="Сервис", menu=toolsmenu)
         self.root.config(menu=menubar)
 
         # Панель инструментов
@@ -221,6 +684,8 @@ class ImprovedPartsApp:
             ("Добавить", self.add_part),
             ("Редактировать", self.edit_part),
             ("Удалить", self.delete_part),
+            ("Приход", self.receive_part),
+            ("Расход", self.issue_part),
             ("Копировать строку", self.copy_row),
             ("Вставить строку", self.paste_row),
             ("Обновить", self.load_data)
@@ -243,6 +708,34 @@ class ImprovedPartsApp:
         self.search_entry.bind("<Control-v>", lambda e: self.paste_to_search())
         self.search_entry.bind("<Control-C>", lambda e: self.copy_search_text())
         self.search_entry.bind("<Control-V>", lambda e: self.paste_to_search())
+        # Поиск по мере ввода; Enter ищет сразу
+        self.search_entry.bind("<KeyRelease>", self.schedule_search)
+        self.search_entry.bind("<Return>", lambda e: self.search_parts())
+
+        # Фильтры по столбцам
+        filter_frame = ttk.Frame(self.root)
+        filter_frame.pack(fill=tk.X, padx=5, pady=(0, 5))
+        self.filter_entries = {}
+        filter_fields = [
+            ('Поставщик:', 'supplier', 20),
+            ('Кол-во меньше:', 'quantity_below', 6),
+            ('Цена от:', 'price_min', 8),
+            ('до:', 'price_max', 8),
+            ('Дата с:', 'date_from', 10),
+            ('по:', 'date_to', 10)
+        ]
+        for label, name, width in filter_fields:
+            ttk.Label(filter_frame, text=label).pack(side=tk.LEFT, padx=(6, 2))
+            if name == 'supplier':
+                entry = ttk.Combobox(filter_frame, width=width)
+                entry.bind("<<ComboboxSelected>>", lambda e: self.apply_filters())
+            else:
+                entry = ttk.Entry(filter_frame, width=width)
+            entry.pack(side=tk.LEFT)
+            entry.bind("<Return>", lambda e: self.apply_filters())
+            self.filter_entries[name] = entry
+        ttk.Button(filter_frame, text="Применить", command=self.apply_filters).pack(side=tk.LEFT, padx=(6, 2))
+        ttk.Button(filter_frame, text="Сбросить", command=self.reset_filters).pack(side=tk.LEFT, padx=2)
 
         # Таблица
         columns = [
@@ -259,22 +752,62 @@ class ImprovedPartsApp:
         self.tree = ttk.Treeview(
             self.root,
             columns=[col[0] for col in columns],
-            show='headings'
+            show='headings',
+            selectmode='extended'  # Ctrl/Shift+клик — выбор нескольких строк для групповых действий
         )
 
-        for col, width in columns:
-            self.tree.heading(col, text=col)
+        # Щелчок по заголовку сортирует таблицу запросом к базе (описание не сортируется)
+        for (col, width), field in zip(columns, PART_COLUMNS):
+            if field not in SORT_COLUMNS:
+                self.tree.heading(col, text=col)
+            else:
+                self.tree.heading(col, text=col, command=lambda f=field: self.sort_by(f))
             self.tree.column(col, width=width, anchor=tk.CENTER)
 
-        scroll = ttk.Scrollbar(self.root, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscroll=scroll.set)
-        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        # Строка состояния: чем занят фоновый поток, индикатор и отмена
+        status_bar = ttk.Frame(self.root)
+        status_bar.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=(0, 5))
+        self.status_label = ttk.Label(status_bar, text="Готово")
+        self.status_label.pack(side=tk.LEFT)
+        self.cancel_button = ttk.Button(status_bar, text="Отмена", command=self.cancel_tasks)
+        self.progress = ttk.Progressbar(status_bar, mode='indeterminate', length=150)
+
+        # Сводка справа от таблицы: итоги читаются из готовых агрегатов базы (см. refresh_dashboard)
+        dashboard = ttk.LabelFrame(self.root, text="Сводка")
+        dashboard.pack(side=tk.RIGHT, fill=tk.Y, padx=(0, 5))
+        self.dashboard_label = ttk.Label(dashboard, text="", justify=tk.LEFT)
+        self.dashboard_label.pack(fill=tk.X, padx=5, pady=5)
+        self.supplier_totals = ttk.Treeview(dashboard, columns=('Поставщик', 'Позиций', 'Стоимость'),
+                                            show='headings', height=8)
+        self.low_stock_label = ttk.Label(dashboard, text="Заканчиваются")
+        self.low_stock = ttk.Treeview(dashboard, columns=('Название', 'Остаток', 'Мин.'), show='headings')
+        for tree, widths in ((self.supplier_totals, (120, 60, 90)), (self.low_stock, (150, 60, 60))):
+            for col, width in zip(tree['columns'], widths):
+                tree.heading(col, text=col)
+                tree.column(col, width=width, anchor=tk.CENTER)
+        self.supplier_totals.pack(fill=tk.X, padx=5)
+        self.low_stock_label.pack(fill=tk.X, padx=5, pady=(5, 0))
+        self.low_stock.pack(fill=tk.BOTH, expand=True, padx=5, pady=(0, 5))
+
+        # Строки подгружаются страницами по мере прокрутки (см. on_tree_scroll)
+        self.scroll = ttk.Scrollbar(self.root, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscroll=self.on_tree_scroll)
+        self.scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.tag_configure('skeleton', foreground='gray75')
         self.tree.pack(fill=tk.BOTH, expand=True)
 
     def setup_context_menu(self):
         self.context_menu = tk.Menu(self.root, tearoff=0)
         self.context_menu.add_command(label="Копировать", command=self.copy_row)
         self.context_menu.add_command(label="Вставить", command=self.paste_row)
+        self.context_menu.add_separator()
+        self.context_menu.add_command(label="Редактировать", command=self.edit_part)
+        self.context_menu.add_command(label="Удалить", command=self.delete_part)
+        self.context_menu.add_separator()
+        self.context_menu.add_command(label="Приход...", command=self.receive_part)
+        self.context_menu.add_command(label="Расход...", command=self.issue_part)
+        self.context_menu.add_command(label="История движения", command=self.show_movements)
+        self.context_menu.add_command(label="Мин. остаток...", command=self.set_min_quantity)
         self.tree.bind("<Button-3>", self.show_context_menu)
 
         self.root.bind_all("<Control-KeyPress>", self.check_hotkeys)
@@ -286,45 +819,360 @@ class ImprovedPartsApp:
         if ctrl:
             if keycode == 54:  # C
                 self.copy_row()
-            elif keycode == 55:  # V
+            elif keycode == 55 and self.root.focus_get() is self.tree:  # V
+                # Ctrl+V в поле поиска, фильтрах и диалогах вставляет текст туда, а не строки в базу
                 self.paste_row()
 
     def show_context_menu(self, event):
         item = self.tree.identify_row(event.y)
-        if item:
+        if item and item not in self.skeleton_items:
             self.context_menu.tk_popup(event.x_root, event.y_root)
 
     def load_data(self, search_term=None):
+        """Загружает первую страницу записей вместо текущих строк таблицы"""
         if not self.current_db:
             messagebox.showwarning("Ошибка", "База данных не выбрана")
             return
 
-        self.tree.delete(*self.tree.get_children())  # Очистить дерево
+        if self.page_task:
+            self.page_task.cancel()  # Прерывает запрос, если он уже выполняется
+            self.page_task = None
+        # Прежние строки остаются на экране, пока не придет новая выдача:
+        # при поиске по мере ввода таблица не мигает пустой на каждую букву
+        self.replace_rows = True
+        self.show_skeleton()  # Только если таблица пуста: прежние строки остаются на месте
+        self.search_term = search_term
+        self.search_ranked = False
+        self.first_key = self.last_key = None
+        self.has_prev_page = False
+        self.has_next_page = True
+        self.request_page(forward=True)
+
+    def request_page(self, forward):
+        """Запрашивает в фоне следующую (forward) или предыдущую страницу"""
+        if self.page_task or not (self.has_next_page if forward else self.has_prev_page):
+            return
+        after, before = (self.last_key, None) if forward else (None, self.first_key)
+        self.page_task = self.worker.submit(
+            'read_page', self.search_term, self.search_ranked, after, before,
+            self.sort_column, self.sort_descending, self.filters,
+            description="Загрузка записей",
+            on_done=lambda result: self.show_page(forward, *result),
+            on_error=self.page_failed
+        )
 
-        conn = sqlite3.connect(self.current_db)
+    def show_page(self, forward, page, ranked):
+        self.page_task = None
+        self.search_ranked = ranked
+        started = time.perf_counter()
+        with PROFILER.measure("Окно: вставка страницы в таблицу", len(page)):
+            self.hide_skeleton()
+            self.clear_replaced_rows()
+            if forward:
+                self.append_page(page)
+            else:
+                self.prepend_page(page)
+        if PROFILER.enabled:
+            # Tk перерисовывает таблицу в простое: замер after_idle включает и отрисовку
+            self.root.after_idle(lambda: PROFILER.record("Окно: страница до отрисовки",
+                                                         time.perf_counter() - started, len(page)))
+        if self.startup_pending:
+            self.startup_pending = False
+            # Замеряем, когда строки уже нарисованы: отрисовка Tk тоже идет в простое
+            self.root.after_idle(self.report_startup)
+
+    def page_failed(self, e):
+        self.page_task = None
+        self.hide_skeleton()
+        self.clear_replaced_rows()
+        self.has_prev_page = self.has_next_page = False
+        messagebox.showerror("Ошибка БД", f"Не удалось загрузить записи: {str(e)}")
+
+    def show_skeleton(self):
+        """Заполняет пустую таблицу серыми строками-заглушками, пока грузится первая страница"""
+        if self.skeleton_items or self.tree.get_children():
+            return
+        placeholder = ["░░░░░░"] * len(PART_COLUMNS)
+        self.skeleton_items = [self.tree.insert('', tk.END, values=placeholder, tags=('skeleton',))
+                               for _ in range(SKELETON_ROWS)]
+
+    def hide_skeleton(self):
+        if self.skeleton_items:
+            self.tree.delete(*self.skeleton_items)
+            self.skeleton_items = []
+
+    def report_startup(self):
+        """Показывает, сколько заняли импорт модулей и путь до первой строки на экране"""
+        self.root.update_idletasks()
+        imported_ms = (IMPORTED - STARTED) * 1000
+        first_row_ms = (time.perf_counter() - STARTED) * 1000
+        self.ready_text = f"Готово. Запуск: импорт {imported_ms:.0f} мс, первая строка {first_row_ms:.0f} мс"
+        self.update_status()
+        history = self.settings.get('startup', [])[-(STARTUP_HISTORY - 1):]
+        history.append({'time': timestamp(), 'import_ms': round(imported_ms), 'first_row_ms': round(first_row_ms)})
+        self.settings['startup'] = history
+        save_settings(self.settings)
+        if self.startup_report:
+            print(json.dumps(history[-1], ensure_ascii=False))
+            self.on_close()
+
+    def clear_replaced_rows(self):
+        """Убирает строки прежней выдачи, если пришла первая страница новой"""
+        if self.replace_rows:
+            self.replace_rows = False
+            self.forget_items(self.tree.get_children())
+
+    def append_page(self, page):
+        """Дописывает страницу в конец таблицы"""
+        self.has_next_page = len(page) == PAGE_SIZE
+        if not page:
+            return
+
+        top = self.top_row_index()
+        for key, row in page:
+            if not self.tree.exists(row[0]):
+                self.item_keys[self.tree.insert('', tk.END, iid=row[0], values=display_values(row))] = key
+        if self.first_key is None:
+            self.first_key = page[0][0]
+        self.last_key = page[-1][0]
+
+        # Держим в дереве не больше MAX_LOADED_ROWS строк: лишние сверху выбрасываем
+        children = self.tree.get_children()
+        excess = len(children) - MAX_LOADED_ROWS
+        if excess > 0:
+            self.forget_items(children[:excess])
+            self.first_key = self.item_keys[children[excess]]
+            self.has_prev_page = True
+            self.scroll_to_row(top - excess)
+
+    def prepend_page(self, page):
+        """Возвращает в начало таблицы ранее выброшенную страницу"""
+        self.has_prev_page = len(page) == PAGE_SIZE
+        if not page:
+            return
+
+        top = self.top_row_index()
+        for index, (key, row) in enumerate(page):
+            if not self.tree.exists(row[0]):
+                self.item_keys[self.tree.insert('', index, iid=row[0], values=display_values(row))] = key
+        self.first_key = page[0][0]
+
+        children = self.tree.get_children()
+        excess = len(children) - MAX_LOADED_ROWS
+        if excess > 0:
+            self.forget_items(children[-excess:])
+            self.last_key = self.item_keys[children[-excess - 1]]
+            self.has_next_page = True
+        self.scroll_to_row(top + len(page))
+
+    def insert_row(self, row):
+        """Показывает только что добавленную запись, не перечитывая таблицу"""
+        # Новая запись получает наибольший id, то есть попадает в конец таблицы;
+        # показываем ее, только если загруженное окно уже доходит до конца
+        if (self.search_term or self.filters or self.sort_column != 'id' or self.sort_descending
+                or self.has_next_page or self.page_task or self.replace_rows):
+            return
+        self.item_keys[self.tree.insert('', tk.END, iid=row[0], values=display_values(row))] = row[0]
+        if self.first_key is None:
+            self.first_key = row[0]
+        self.last_key = row[0]
+
+    def refresh_row(self, row):
+        """Обновляет значения одной строки таблицы на месте"""
+        if row and self.tree.exists(row[0]):
+            self.tree.item(row[0], values=display_values(row))
+
+    def remove_rows(self, part_ids):
+        """Убирает из таблицы удаленные записи"""
+        items = [part_id for part_id in part_ids if self.tree.exists(part_id)]
+        if not items:
+            return
+        removed_keys = sorted(self.item_keys[item] for item in items)
+        self.forget_items(items)
+        if self.replace_rows:
+            return  # Ключи прежней выдачи больше не нужны
+        if self.search_ranked:
+            # Ключи ранжированной выдачи — позиции: записи ниже сдвигаются вверх
+            # на число удаленных перед ними
+            for item, item_key in self.item_keys.items():
+                self.item_keys[item] = item_key - bisect.bisect_left(removed_keys, item_key)
+            if self.last_key is not None:
+                self.last_key -= len(removed_keys)
+        children = self.tree.get_children()
+        if children:
+            self.first_key = self.item_keys[children[0]]
+            self.last_key = self.item_keys[children[-1]]
+
+    def forget_items(self, items):
+        """Убирает строки из таблицы вместе с их ключами пагинации"""
+        self.tree.delete(*items)
+        for item in items:
+            del self.item_keys[item]
+
+    def top_row_index(self):
+        """Индекс первой видимой строки таблицы"""
+        return round(self.tree.yview()[0] * len(self.tree.get_children()))
+
+    def scroll_to_row(self, index):
+        """Прокручивает таблицу так, чтобы строка index оказалась сверху"""
+        total = len(self.tree.get_children())
+        if total:
+            self.tree.yview_moveto(max(index, 0) / total)
+
+    def on_tree_scroll(self, first, last):
+        """Подгружает соседние страницы, когда прокрутка подходит к краю окна"""
+        self.scroll.set(first, last)
+        if not self.current_db:
+            return
+        if float(last) >= 1 - SCROLL_PREFETCH:
+            self.request_page(forward=True)
+        elif float(first) <= SCROLL_PREFETCH:
+            self.request_page(forward=False)
+
+    def sort_by(self, field):
+        """Сортирует таблицу по полю; повторный щелчок меняет направление"""
+        if self.sort_column == field:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = field
+            self.sort_descending = False
+
+        for col, column_field in zip(self.tree['columns'], PART_COLUMNS):
+            text = col
+            if column_field == self.sort_column:
+                text += " ▼" if self.sort_descending else " ▲"
+            self.tree.heading(col, text=text)
+        if self.current_db:
+            self.load_data(self.search_term)
+
+    def apply_filters(self):
+        """Перечитывает таблицу с фильтрами, заполненными над ней"""
+        converters = {
+            'supplier': str,
+            'quantity_below': int,
+            'price_min': float,
+            'price_max': float,
+            'date_from': parse_date,
+            'date_to': parse_date,
+        }
         try:
-            cursor = conn.cursor()
+            filters = {
+                name: converters[name](entry.get().strip())
+                for name, entry in self.filter_entries.items() if entry.get().strip()
+            }
+        except ValueError as e:
+            messagebox.showerror("Ошибка", f"Некорректный фильтр: {str(e)}")
+            return
+        self.filters = filters
+        if self.current_db:
+            self.load_data(self.search_term)
+
+    def reset_filters(self):
+        for entry in self.filter_entries.values():
+            entry.delete(0, tk.END)
+        self.apply_filters()
+
+    def refresh_suppliers(self):
+        """Обновляет список поставщиков в фильтре"""
+        def done(suppliers):
+            self.filter_entries['supplier']['values'] = suppliers
+
+        self.worker.submit('suppliers', description="Загрузка поставщиков", on_done=done)
+
+    def poll_changes(self):
+        """Раз в CHANGE_POLL_MS проверяет, не изменили ли базу другие пользователи"""
+        self.root.after(CHANGE_POLL_MS, self.poll_changes)
+        if not self.current_db or self.changes_task or self.replace_rows:
+            return
 
-            # Проверка существования таблицы parts
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='parts'")
-            if not cursor.fetchone():
-                messagebox.showwarning("Ошибка", "Таблица 'parts' не найдена в базе данных")
-                return
+        def done(result):
+            self.changes_task = None
+            if result is not None:
+                self.apply_changes(*result)
 
-            if search_term:
-                cursor.execute('''
-                    SELECT * FROM parts 
-                    WHERE name LIKE ? 
-                    OR part_number LIKE ? 
-                    OR description LIKE ?
-                 ''', (f'%{search_term}%', f'%{search_term}%', f'%{search_term}%'))
-            else:
-                cursor.execute('SELECT * FROM parts')
+        def failed(e):
+            self.changes_task = None  # Повторим при следующей проверке
 
-            for row in cursor.fetchall():
-                self.tree.insert('', tk.END, values=row)  # Добавить найденные данные в дерево
-        finally:
-            conn.close()
+        self.changes_task = self.worker.submit(
+            'changes', self.change_counter, list(self.item_keys),
+            description="Проверка изменений", on_done=done, on_error=failed, quiet=True
+        )
+
+    def apply_changes(self, counter, rows, deleted):
+        """Обновляет в таблице только строки, измененные или удаленные другими пользователями"""
+        self.change_counter = counter
+        with PROFILER.measure("Окно: изменения других пользователей", len(rows) + len(deleted)):
+            for row in rows:
+                self.refresh_row(row)
+            self.remove_rows([str(part_id) for part_id in deleted])
+        self.refresh_dashboard()
+
+    def refresh_dashboard(self):
+        """Обновляет панель сводки: стоимость склада, поставщики, заканчивающиеся запчасти"""
+        def done(summary):
+            with PROFILER.measure("Окно: сводка", len(summary['suppliers']) + len(summary['low_stock'])):
+                self.dashboard_label.config(text=(
+                    f"Стоимость склада: {format_money(summary['value'])}\n"
+                    f"Позиций: {summary['parts']}, штук: {summary['quantity']}"
+                ))
+                self.supplier_totals.delete(*self.supplier_totals.get_children())
+                for supplier, parts, _, value in summary['suppliers']:
+                    self.supplier_totals.insert('', tk.END, values=(supplier, parts, format_money(value)))
+                self.low_stock_label.config(text=f"Заканчиваются: {summary['low_stock_count']}")
+                self.low_stock.delete(*self.low_stock.get_children())
+                for part_id, name, _, quantity, min_quantity, _ in summary['low_stock']:
+                    self.low_stock.insert('', tk.END, iid=part_id, values=display_values((name, quantity, min_quantity)))
+
+        def failed(e):
+            self.dashboard_label.config(text=f"Сводка недоступна: {str(e)}")
+
+        self.worker.submit('dashboard', description="Загрузка сводки",
+                           on_done=done, on_error=failed)
+
+    def toggle_profiling(self):
+        PROFILER.enable(self.profile_var.get())
+        self.settings['profile'] = self.profile_var.get()
+        save_settings(self.settings)
+
+    def update_status(self):
+        """Показывает в строке состояния, чем занят фоновый поток"""
+        active = [task for task in self.worker.active if not task.quiet]
+        if active:
+            task = active[0]
+            text = task.description + "..."
+            fraction = None
+            if task.status:
+                text += f" {task.status[0]}"
+                fraction = task.status[1]
+            if len(active) > 1:
+                text += f" (ещё задач: {len(active) - 1})"
+            self.status_label.config(text=text)
+            shown = bool(self.progress.winfo_manager())
+            if not shown:
+                self.cancel_button.pack(side=tk.RIGHT, padx=2)
+                self.progress.pack(side=tk.RIGHT, padx=2)
+            if fraction is not None:
+                self.progress.stop()
+                self.progress.config(mode='determinate', value=fraction * 100)
+            elif not shown or str(self.progress['mode']) != 'indeterminate':
+                self.progress.config(mode='indeterminate', value=0)
+                self.progress.start(10)
+        else:
+            self.status_label.config(text=self.ready_text)
+            self.progress.stop()
+            self.progress.pack_forget()
+            self.cancel_button.pack_forget()
+
+    def cancel_tasks(self):
+        """Отменяет все запросы, которые еще выполняются или ждут очереди"""
+        self.worker.cancel_all()
+        if self.page_task or self.replace_rows:
+            # Выдача не придет: как при ошибке загрузки, убираем заглушки и недозагруженные строки
+            self.clear_replaced_rows()
+            self.has_prev_page = self.has_next_page = False
+        self.page_task = self.changes_task = None
+        # Отмененное открытие базы сообщит о себе само (open_source.failed)
+        self.hide_skeleton()
 
     def open_database(self):
         """Открывает выбранную базу данных"""
@@ -332,34 +1180,8 @@ class ImprovedPartsApp:
             filetypes=[("Базы данных", "*.db"), ("Все файлы", "*.*")]
         )
         if file_path:
-            try:
-                conn = sqlite3.connect(file_path)
-                cursor = conn.cursor()
-
-                # Проверка существования таблицы parts
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='parts'")
-                if not cursor.fetchone():
-                    # Если таблица отсутствует, создаем её
-                    cursor.execute('''
-                        CREATE TABLE IF NOT EXISTS parts (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            name TEXT NOT NULL,
-                            part_number TEXT UNIQUE,
-                            quantity INTEGER,
-                            price REAL,
-                            supplier TEXT,
-                            description TEXT,
-                            date_added TEXT
-                        )
-                    ''')
-                    conn.commit()
-
-                conn.close()
-                self.current_db = file_path
-                self.load_data()
-                messagebox.showinfo("Успех", "База данных успешно загружена")
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Не удалось открыть базу:\n{str(e)}")
+            # Создаем недостающие таблицы и поисковый индекс
+            self.open_source(file_path, "База данных успешно загружена", "Не удалось открыть базу")
 
     def save_database_as(self):
         """Создает новую базу данных и сохраняет ее"""
@@ -368,34 +1190,270 @@ class ImprovedPartsApp:
             filetypes=[("Базы данных", "*.db"), ("Все файлы", "*.*")]
         )
         if file_path:
-            try:
-                # Создаем пустую базу данных
-                conn = sqlite3.connect(file_path)
-                cursor = conn.cursor()
-
-                # Создаем таблицу parts
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS parts (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        name TEXT NOT NULL,
-                        part_number TEXT UNIQUE,
-                        quantity INTEGER,
-                        price REAL,
-                        supplier TEXT,
-                        description TEXT,
-                        date_added TEXT
-                    )
-                ''')
-                conn.commit()
-                conn.close()
-
-                self.current_db = file_path
-                self.load_data()
-                messagebox.showinfo("Успех", f"Новая база данных создана:\n{file_path}")
-            except Exception as e:
-                messagebox.showerror("Ошибка", f"Ошибка при создании базы:\n{str(e)}")
+            # Создаем пустую базу данных с таблицей parts и поисковым индексом
+            self.open_source(file_path, f"Новая база данных создана:\n{file_path}", "Ошибка при создании базы")
 
 
+    def connect_server(self):
+        """Работает с базой через сервер parts_server.py вместо файла"""
+        url = simpledialog.askstring("Сервер", "Адрес сервера:", parent=self.root,
+                                     initialvalue=f"http://127.0.0.1:{DEFAULT_PORT}")
+        if not url:
+            return
+        url = url.strip()
+        if not is_server_url(url):
+            url = "http://" + url
+        self.open_source(url, error_message="Не удалось подключиться к серверу")
+
+    def open_source(self, path, success_message=None, error_message="Не удалось открыть базу",
+                    on_error=None):
+        """Переключает программу на файл базы или сервер path и загружает первую страницу"""
+        def done(_):
+            self.current_db = path
+            self.change_counter = 0
+            self.root.title(f"Учет запчастей — {path}")
+            self.remember_recent(path)
+            self.load_data()
+            self.refresh_suppliers()
+            self.refresh_dashboard()
+            if success_message:
+                messagebox.showinfo("Успех", success_message)
+
+        def failed(e):
+            self.hide_skeleton()
+            if isinstance(e, TaskCancelled):
+                self.startup_pending = False  # Открытие отменил пользователь: замерять нечего
+            else:
+                messagebox.showerror("Ошибка", f"{error_message}:\n{str(e)}")
+            if on_error:
+                on_error()
+
+        self.worker.open(path, on_done=done, on_error=failed)
+
+    def remember_recent(self, path):
+        """Ставит path первым в списке недавних баз"""
+        recent = [path] + [item for item in self.settings.get('recent', []) if item != path]
+        self.settings['recent'] = recent[:RECENT_LIMIT]
+        save_settings(self.settings)
+        self.update_recent_menu()
+
+    def update_recent_menu(self):
+        self.recent_menu.delete(0, tk.END)
+        for path in self.settings.get('recent', []):
+            self.recent_menu.add_command(label=path, command=lambda p=path: self.open_source(p))
+        if not self.settings.get('recent'):
+            self.recent_menu.add_command(label="(пусто)", state=tk.DISABLED)
+
+    def local_database(self):
+        """Открыт ли файл базы: резервные копии и обслуживание сервера делаются на нем самом"""
+        if not self.current_db:
+            messagebox.showwarning("Ошибка", "Сначала создайте или откройте базу данных")
+            return False
+        if is_server_url(self.current_db):
+            messagebox.showinfo("Обслуживание", "База открыта через сервер: копии и обслуживание "
+                                                "выполняются на сервере")
+            return False
+        return True
+
+    def backup_database(self):
+        """Сохраняет согласованную копию открытой базы, не прерывая работу с ней"""
+        if not self.local_database():
+            return
+        name = os.path.splitext(os.path.basename(self.current_db))[0]
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".db", initialfile=f"{name}-{datetime.now():%Y%m%d-%H%M}.db",
+            filetypes=[("Базы данных", "*.db"), ("Все файлы", "*.*")]
+        )
+        if not file_path:
+            return
+
+        def done(stats):
+            messagebox.showinfo(
+                "Резервная копия",
+                f"Копия сохранена:\n{file_path}\n"
+                f"Размер: {stats['bytes'] / 1024 / 1024:.1f} МБ\n"
+                f"Время: {stats['seconds']:.1f} с"
+            )
+
+        def failed(e):
+            messagebox.showerror("Ошибка", f"Не удалось сохранить копию:\n{str(e)}")
+
+        self.worker.submit('backup', file_path, description="Резервная копия", with_progress=True,
+                           writes=True, on_done=done, on_error=failed)
+
+    def snapshot_database(self):
+        """Дописывает снимок базы в каталог снимков рядом с ней: сохраняются только изменившиеся куски"""
+        if not self.local_database():
+            return
+        directory = snapshot_dir(self.current_db)
+
+        def done(stats):
+            messagebox.showinfo(
+                "Снимок базы",
+                f"Снимок сохранен в {directory}\n"
+                f"База: {stats['bytes'] / 1024 / 1024:.1f} МБ, кусков {stats['chunks']}, "
+                f"новых {stats['new_chunks']}\n"
+                f"Записано: {stats['written'] / 1024 / 1024:.1f} МБ\n"
+                f"Все снимки ({stats['snapshots']}): {stats['store_bytes'] / 1024 / 1024:.1f} МБ\n"
+                f"Время: {stats['seconds']:.1f} с"
+            )
+
+        def failed(e):
+            messagebox.showerror("Ошибка", f"Не удалось сохранить снимок:\n{str(e)}")
+
+        self.worker.submit(write_snapshot, directory, description="Снимок базы", with_progress=True,
+                           writes=True, on_done=done, on_error=failed)
+
+    def restore_database(self):
+        """Собирает базу из выбранного снимка в новый файл и предлагает открыть ее"""
+        directory = snapshot_dir(self.current_db) if self.current_db and not is_server_url(self.current_db) else None
+        manifest_path = filedialog.askopenfilename(
+            title="Снимок", initialdir=directory if directory and os.path.isdir(directory) else None,
+            filetypes=[("Снимки базы", "snapshot-*.json"), ("Все файлы", "*.*")]
+        )
+        if not manifest_path:
+            return
+        file_path = filedialog.asksaveasfilename(
+            title="Восстановить в файл", defaultextension=".db",
+            filetypes=[("Базы данных", "*.db"), ("Все файлы", "*.*")]
+        )
+        if not file_path:
+            return
+        if self.current_db and os.path.abspath(file_path) == os.path.abspath(self.current_db):
+            messagebox.showerror("Ошибка", "Нельзя восстановить снимок поверх открытой базы")
+            return
+
+        def restore(repository, manifest_path, path, progress):
+            return restore_snapshot(manifest_path, path, progress=progress)
+
+        def done(stats):
+            if messagebox.askyesno(
+                "Восстановление",
+                f"Снимок от {stats['created']} восстановлен в {file_path}\n"
+                f"Размер: {stats['bytes'] / 1024 / 1024:.1f} МБ, время: {stats['seconds']:.1f} с\n\n"
+                f"Открыть восстановленную базу?"
+            ):
+                self.open_source(file_path)
+
+        def failed(e):
+            messagebox.showerror("Ошибка", f"Не удалось восстановить снимок:\n{str(e)}")
+
+        self.worker.submit(restore, manifest_path, file_path, description="Восстановление из снимка",
+                           with_progress=True, writes=True, on_done=done, on_error=failed)
+
+    def analyze_database(self):
+        """Пересчитывает статистику, по которой SQLite выбирает индексы"""
+        if not self.local_database():
+            return
+        self.worker.submit('optimize', True, description="Обновление статистики",
+                           on_done=lambda seconds: messagebox.showinfo(
+                               "Обслуживание", f"Статистика обновлена за {seconds:.1f} с"))
+
+    def vacuum_database(self):
+        """Перестраивает файл базы, возвращая место удаленных записей"""
+        if not self.local_database():
+            return
+        if not messagebox.askyesno("Сжать базу", "Перестроить файл базы? На большой базе это займет время, "
+                                                 "и до конца работа с ней будет недоступна"):
+            return
+
+        def done(stats):
+            messagebox.showinfo(
+                "Обслуживание",
+                f"Размер базы: {stats['bytes_before'] / 1024 / 1024:.1f} → {stats['bytes'] / 1024 / 1024:.1f} МБ\n"
+                f"Время: {stats['seconds']:.1f} с"
+            )
+
+        self.worker.submit('vacuum', description="Сжатие базы", on_done=done)
+
+    def run_maintenance(self):
+        """Плановое обслуживание: PRAGMA optimize и incremental_vacuum, если накопилось свободное место"""
+        self.root.after(MAINTENANCE_INTERVAL * 1000, self.run_maintenance)
+        if self.current_db and not is_server_url(self.current_db):
+            # База может быть занята другим пользователем: тогда обслужим в следующий раз
+            self.worker.submit('maintain', description="Обслуживание базы", quiet=True,
+                               on_error=lambda e: None)
+
+    def import_file(self):
+        """Загружает прайс-лист поставщика целиком, обновляя существующие артикулы"""
+        if not self.current_db:
+            messagebox.showwarning("Ошибка", "Сначала создайте или откройте базу данных")
+            return
+
+        file_path = filedialog.askopenfilename(
+            filetypes=[("Прайс-листы", "*.csv *.xlsx"), ("CSV", "*.csv"), ("Excel", "*.xlsx"),
+                       ("Все файлы", "*.*")]
+        )
+        if not file_path:
+            return
+
+        def done(stats):
+            self.load_data()
+            self.refresh_suppliers()
+            self.refresh_dashboard()
+            total = stats['inserted'] + stats['updated']
+            speed = total / stats['seconds'] if stats['seconds'] else total
+            message = (
+                f"Добавлено: {stats['inserted']}, обновлено: {stats['updated']}\n"
+                f"Отклонено строк: {len(stats['rejected'])}\n"
+                f"Время: {stats['seconds']:.1f} с ({speed:.0f} строк/с)"
+            )
+            if stats['rejected']:
+                message += "\n\n" + "\n".join(
+                    f"Строка {number}: {reason}" for number, reason in stats['rejected'][:10]
+                )
+                if len(stats['rejected']) > 10:
+                    message += f"\n...и еще {len(stats['rejected']) - 10}"
+            messagebox.showinfo("Импорт завершен", message)
+
+        def failed(e):
+            self.load_data()  # Часть пачек могла успеть зафиксироваться
+            messagebox.showerror("Ошибка импорта", f"Не удалось загрузить файл:\n{str(e)}")
+
+        self.worker.submit(import_file, file_path, description="Импорт", with_progress=True,
+                           writes=True, on_done=done, on_error=failed)
+
+    def export_file(self):
+        """Выгружает в файл всю таблицу или текущую выборку (поиск и фильтры)"""
+        if not self.current_db:
+            messagebox.showwarning("Ошибка", "Сначала создайте или откройте базу данных")
+            return
+
+        search_term, filters = None, None
+        if self.search_term or self.filters:
+            choice = messagebox.askyesnocancel(
+                "Экспорт",
+                "Выгрузить только найденные записи? (Нет — всю таблицу)"
+            )
+            if choice is None:
+                return
+            if choice:
+                search_term, filters = self.search_term, dict(self.filters)
+
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("Excel", "*.xlsx"), ("Parquet", "*.parquet"),
+                       ("Arrow", "*.arrow")]
+        )
+        if not file_path:
+            return
+
+        def done(stats):
+            speed = stats['rows'] / stats['seconds'] if stats['seconds'] else stats['rows']
+            messagebox.showinfo(
+                "Экспорт завершен",
+                f"Выгружено записей: {stats['rows']}\n"
+                f"Размер файла: {stats['bytes'] / 1024 / 1024:.1f} МБ\n"
+                f"Время: {stats['seconds']:.1f} с ({speed:.0f} строк/с)"
+            )
+
+        def failed(e):
+            messagebox.showerror("Ошибка экспорта", f"Не удалось выгрузить данные:\n{str(e)}")
+
+        self.worker.submit(export_file, file_path, search_term, self.sort_column, self.sort_descending,
+                           filters, description="Экспорт", with_progress=True,
+                           writes=True, on_done=done, on_error=failed)
+
     def add_part(self):
         """Добавляет новую запчасть"""
         if not self.current_db:
@@ -440,10 +1498,11 @@ class AddEditDialog:
                 else:
                     value = part.get(field, '')
 
+                value = '' if value is None else str(value)
                 if isinstance(entry, ttk.Entry):
-                    entry.insert(0, str(value))
+                    entry.insert(0, value)
                 else:
-                    entry.insert('1.0', str(value))
+                    entry.insert('1.0', value)
 
         btn_frame = ttk.Frame(self.top)
         btn_frame.grid(row=len(fields), column=0, columnspan=2, pady=10)
@@ -463,7 +1522,7 @@ class AddEditDialog:
                 float(self.entries['price'].get()),
                 self.entries['supplier'].get(),
                 description,
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                timestamp()
             )
             self.values = values
             self.top.destroy()
@@ -471,7 +1530,232 @@ class AddEditDialog:
             messagebox.showerror("Ошибка", f"Некорректные данные: {str(e)}")
 
 
+class BulkEditDialog:
+    """Окно изменения полей сразу у нескольких запчастей; пустое поле не меняется"""
+
+    def __init__(self, parent, count):
+        self.top = tk.Toplevel(parent)
+        self.top.title(f"Изменить выбранные запчасти ({count} шт.)")
+        self.changes = None
+
+        fields = [
+            ('Поставщик', 'supplier'),
+            ('Цена', 'price'),
+            ('Количество', 'quantity')
+        ]
+
+        self.entries = {}
+        for i, (label, field) in enumerate(fields):
+            ttk.Label(self.top, text=f"{label}:").grid(row=i, column=0, padx=5, pady=5, sticky=tk.E)
+            entry = ttk.Entry(self.top)
+            entry.grid(row=i, column=1, padx=5, pady=5, sticky=tk.W + tk.E)
+            self.entries[field] = entry
+
+        btn_frame = ttk.Frame(self.top)
+        btn_frame.grid(row=len(fields), column=0, columnspan=2, pady=10)
+
+        ttk.Button(btn_frame, text="Сохранить", command=self.save).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Отмена", command=self.top.destroy).pack(side=tk.LEFT, padx=5)
+
+    def save(self):
+        converters = {'supplier': str, 'price': float, 'quantity': int}
+        try:
+            changes = {
+                field: converters[field](entry.get().strip())
+                for field, entry in self.entries.items() if entry.get().strip()
+            }
+        except ValueError as e:
+            messagebox.showerror("Ошибка", f"Некорректные данные: {str(e)}")
+            return
+        if not changes:
+            messagebox.showwarning("Ошибка", "Заполните хотя бы одно поле")
+            return
+        self.changes = changes
+        self.top.destroy()
+
+
+class StockMovementDialog:
+    """Окно прихода или расхода: количество и причина"""
+
+    def __init__(self, parent, kind, name, stock):
+        self.top = tk.Toplevel(parent)
+        self.top.title(f"{MOVEMENT_KINDS[kind]}: {name}")
+        self.kind = kind
+        self.quantity = None
+        self.reason = ''
+
+        ttk.Label(self.top, text=f"Остаток: {stock}").grid(row=0, column=0, columnspan=2, padx=5, pady=5)
+        ttk.Label(self.top, text="Количество:").grid(row=1, column=0, padx=5, pady=5, sticky=tk.E)
+        self.quantity_entry = ttk.Entry(self.top)
+        self.quantity_entry.grid(row=1, column=1, padx=5, pady=5, sticky=tk.W + tk.E)
+        self.quantity_entry.focus_set()
+        ttk.Label(self.top, text="Причина:").grid(row=2, column=0, padx=5, pady=5, sticky=tk.E)
+        self.reason_entry = ttk.Entry(self.top, width=40)
+        self.reason_entry.grid(row=2, column=1, padx=5, pady=5, sticky=tk.W + tk.E)
+
+        btn_frame = ttk.Frame(self.top)
+        btn_frame.grid(row=3, column=0, columnspan=2, pady=10)
+        ttk.Button(btn_frame, text="Сохранить", command=self.save).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Отмена", command=self.top.destroy).pack(side=tk.LEFT, padx=5)
+        self.top.bind("<Return>", lambda e: self.save())
+
+    def save(self):
+        try:
+            quantity = int(self.quantity_entry.get().strip())
+            if quantity <= 0:
+                raise ValueError("количество должно быть больше нуля")
+        except ValueError as e:
+            messagebox.showerror("Ошибка", f"Некорректные данные: {str(e)}")
+            return
+        self.quantity = quantity
+        self.reason = self.reason_entry.get().strip()
+        self.top.destroy()
+
+
+class MovementHistoryDialog:
+    """Журнал движения остатка одной запчасти и остаток на выбранную дату"""
+
+    def __init__(self, app, part_id, name, rows):
+        self.app = app
+        self.part_id = part_id
+        self.top = tk.Toplevel(app.root)
+        self.top.title(f"История движения: {name}")
+        self.top.geometry("700x400")
+
+        date_frame = ttk.Frame(self.top)
+        date_frame.pack(fill=tk.X, padx=5, pady=5)
+        ttk.Label(date_frame, text="Остаток на дату (ГГГГ-ММ-ДД):").pack(side=tk.LEFT)
+        self.date_entry = ttk.Entry(date_frame, width=12)
+        self.date_entry.pack(side=tk.LEFT, padx=2)
+        self.date_entry.bind("<Return>", lambda e: self.show_stock_at())
+        ttk.Button(date_frame, text="Показать", command=self.show_stock_at).pack(side=tk.LEFT, padx=2)
+        self.stock_label = ttk.Label(date_frame, text="")
+        self.stock_label.pack(side=tk.LEFT, padx=6)
+
+        columns = [('Время', 140), ('Операция', 130), ('Количество', 90), ('Причина', 300)]
+        tree = ttk.Treeview(self.top, columns=[col for col, _ in columns], show='headings')
+        for col, width in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=width, anchor=tk.CENTER)
+        scroll = ttk.Scrollbar(self.top, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscroll=scroll.set)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(fill=tk.BOTH, expand=True)
+        for _, _, kind, quantity, ts, reason in rows:
+            tree.insert('', tk.END, values=(ts, MOVEMENT_KINDS[kind], f"{quantity:+d}", reason or ''))
+
+    def show_stock_at(self):
+        try:
+            day = parse_date(self.date_entry.get().strip())
+        except ValueError as e:
+            messagebox.showerror("Ошибка", f"Некорректная дата: {str(e)}", parent=self.top)
+            return
+
+        def done(stock):
+            if self.top.winfo_exists():
+                self.stock_label.config(text=f"{stock} шт.")
+
+        # Все движения за день: время в журнале не позже конца дня
+        self.app.worker.submit('stock_at', self.part_id, day + " 23:59:59",
+                               description="Остаток на дату", on_done=done)
+
+
+class ProfilerStatsDialog:
+    """Замеры профилировщика: p50/p95 по операциям, обновляются, пока окно открыто"""
+
+    def __init__(self, parent):
+        self.top = tk.Toplevel(parent)
+        self.top.title("Статистика запросов")
+        self.top.geometry("1000x450")
+
+        info = ("Профилирование выключено: включите его в меню «Сервис»" if not PROFILER.enabled else
+                f"Операции дольше {SLOW_OPERATION_MS} мс с планом запроса пишутся в {SLOW_LOG_PATH}")
+        ttk.Label(self.top, text=info).pack(fill=tk.X, padx=5, pady=5)
+
+        btn_frame = ttk.Frame(self.top)
+        btn_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=5)
+        ttk.Button(btn_frame, text="Сбросить", command=self.reset).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="Закрыть", command=self.top.destroy).pack(side=tk.RIGHT, padx=5)
+
+        columns = [('Операция', 520), ('Вызовов', 70), ('p50, мс', 80), ('p95, мс', 80), ('Макс., мс', 80),
+                   ('Строк', 80)]
+        self.tree = ttk.Treeview(self.top, columns=[col for col, _ in columns], show='headings')
+        for col, width in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=width, anchor=tk.W if col == 'Операция' else tk.E)
+        scroll = ttk.Scrollbar(self.top, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscroll=scroll.set)
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(fill=tk.BOTH, expand=True, padx=5)
+        self.refresh()
+
+    def refresh(self):
+        if not self.top.winfo_exists():
+            return
+        self.tree.delete(*self.tree.get_children())
+        for operation, count, p50, p95, longest, rows in PROFILER.stats():
+            self.tree.insert('', tk.END, values=(operation, count, f"{p50:.2f}", f"{p95:.2f}", f"{longest:.2f}",
+                                                 '' if rows is None else rows))
+        self.top.after(STATS_REFRESH_MS, self.refresh)
+
+    def reset(self):
+        PROFILER.reset()
+        self.refresh()
+
+
+class PastePreviewDialog:
+    """Окно подтверждения вставки нескольких строк из буфера обмена"""
+
+    def __init__(self, parent, rows, rejected):
+        self.top = tk.Toplevel(parent)
+        self.top.title("Вставка строк")
+        self.top.geometry("900x500")
+        self.confirmed = False
+        self.update_existing = True
+
+        summary = f"Будет вставлено строк: {len(rows)}"
+        if rejected:
+            summary += f", отклонено: {len(rejected)} (первая ошибка — строка {rejected[0][0]}: {rejected[0][1]})"
+        ttk.Label(self.top, text=summary).pack(fill=tk.X, padx=5, pady=5)
+
+        columns = ['Название', 'Артикул', 'Количество', 'Цена', 'Поставщик', 'Описание']
+        tree = ttk.Treeview(self.top, columns=columns, show='headings')
+        for col in columns:
+            tree.heading(col, text=col)
+            tree.column(col, width=120, anchor=tk.CENTER)
+        for row in rows[:PASTE_PREVIEW_ROWS]:
+            tree.insert('', tk.END, values=display_values(row[:len(columns)]))
+        if len(rows) > PASTE_PREVIEW_ROWS:
+            tree.insert('', tk.END, values=[f"... еще {len(rows) - PASTE_PREVIEW_ROWS}"])
+
+        scroll = ttk.Scrollbar(self.top, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscroll=scroll.set)
+
+        btn_frame = ttk.Frame(self.top)
+        btn_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=10)
+        self.update_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(btn_frame, text="Обновлять запчасти с совпадающим артикулом",
+                        variable=self.update_var).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="Отмена", command=self.top.destroy).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(btn_frame, text="Вставить", command=self.confirm).pack(side=tk.RIGHT, padx=5)
+
+        scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(fill=tk.BOTH, expand=True, padx=5)
+
+    def confirm(self):
+        self.confirmed = True
+        self.update_existing = self.update_var.get()
+        self.top.destroy()
+
+
 if __name__ == "__main__":
+    if sys.argv[1:2] == ['--serve']:
+        # Без окна: сервер для нескольких пользователей (см. parts_server.py)
+        from parts_server import main
+        main(sys.argv[2:])
+        sys.exit()
     root = tk.Tk()
-    app = ImprovedPartsApp(root)
+    # --startup-time: открыть последнюю базу, напечатать замер запуска (JSON) и выйти
+    # --profile: замерять запросы и отрисовку (Сервис → Статистика запросов)
+    app = ImprovedPartsApp(root, startup_report='--startup-time' in sys.argv[1:], profile='--profile' in sys.argv[1:])
     root.mainloop()
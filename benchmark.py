@@ -0,0 +1,201 @@
+"""Замеры скорости хранилища запчастей на синтетических базах.
+
+Для каждого размера базы (по умолчанию 10 тыс., 100 тыс. и 1 млн строк) строит
+базу через PartsRepository и замеряет вставку, поиск, загрузку страниц таблицы
+и обновление записей. Поиск замеряется и старым способом — LIKE по всей таблице,
+как искала программа до индекса FTS5, — чтобы была видна разница. Результаты
+можно сохранить в JSON и сравнить с прошлым запуском: замеры, ставшие медленнее
+допуска (и больше чем на --min-delta мс), отмечаются, а скрипт завершается с кодом 1.
+
+Запуск: python benchmark.py --sizes 10000,100000 --save bench.json
+        python benchmark.py --sizes 10000,100000 --compare bench.json
+Те же замеры в виде набора pytest-benchmark: tests/bench_repository.py.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from parts_repository import IMPORT_BATCH_SIZE, PAGE_SIZE, PART_SELECT, PartsRepository
+
+WORDS = ['фильтр', 'масляный', 'воздушный', 'ремень', 'генератор', 'свеча', 'зажигания',
+         'колодки', 'тормозные', 'передние', 'задние', 'подшипник', 'ступицы', 'насос',
+         'топливный', 'датчик', 'кислорода', 'амортизатор', 'стойка', 'сальник']
+SUPPLIERS = ['Автодеталь', 'ЗапчастьОпт', 'Bosch', 'Mann', 'NGK', 'Febi']
+SYLLABLES = ['ка', 'ро', 'ми', 'ту', 'ле', 'на', 'зо', 'ви', 'ша', 'пе', 'до', 'гу', 'ры', 'се']
+DESCRIPTION_WORDS = [a + b + c for a in SYLLABLES for b in SYLLABLES for c in SYLLABLES]
+SEARCH_TERMS = ['фильтр', 'фил', 'фильтр K123', 'тормозные колодки', 'AB-1234', 'катуле', 'Bosch K77']
+# Поиск до индекса FTS5: полный просмотр таблицы, для сравнения
+LIKE_SQL = f'''
+    SELECT {PART_SELECT} FROM parts
+    WHERE name LIKE ? OR part_number LIKE ? OR description LIKE ?
+'''
+# Виды таблицы для загрузки страниц: (сортировка, по убыванию, фильтры)
+PAGE_VIEWS = [
+    ('id', False, None),
+    ('name', False, None),
+    ('price', True, None),
+    ('date_added', False, {'supplier': 'Bosch'}),
+    ('price', False, {'price_min': 100.0, 'price_max': 5000.0, 'quantity_below': 250}),
+]
+PAGES_PER_VIEW = 20  # Сколько страниц подряд листаем в каждом виде
+UPDATE_ROWS = 500  # Сколько записей обновляем по одной
+BULK_UPDATE_ROWS = 1000  # Сколько записей меняем одним групповым изменением
+
+
+def synthetic_rows(count, seed=1):
+    """Генерирует строки для вставки в parts"""
+    rnd = random.Random(seed)
+    for i in range(count):
+        supplier = rnd.choice(SUPPLIERS)
+        yield (
+            f'{" ".join(rnd.sample(WORDS, 2))} {supplier} K{rnd.randint(1, 5000)}',
+            f'{rnd.choice("ABCDEF")}{rnd.choice("ABCDEF")}-{i}',
+            rnd.randint(0, 500),
+            round(rnd.uniform(10, 10000), 2),
+            supplier,
+            ' '.join(rnd.sample(DESCRIPTION_WORDS, 8)),
+            f'2024-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} 12:00:00',
+        )
+
+
+def timed(function, repeat):
+    """Лучшее время из repeat запусков, в миллисекундах, и результат"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_insert(repository, size):
+    """Заполняет пустую базу пачками insert_many; время на 1000 строк"""
+    rows = synthetic_rows(size)
+    started = time.perf_counter()
+    while True:
+        batch = [row for _, row in zip(range(IMPORT_BATCH_SIZE), rows)]
+        if not batch:
+            break
+        repository.insert_many(batch)
+    elapsed = (time.perf_counter() - started) * 1000
+    return {'insert, мс/1000 строк': elapsed / size * 1000}
+
+
+def like_search(repository, term):
+    """Выдача старого поиска через LIKE"""
+    return repository.conn.execute(LIKE_SQL, (f'%{term}%',) * 3).fetchall()
+
+
+def bench_search(repository, repeat):
+    """Первая страница выдачи поиска для каждой строки из SEARCH_TERMS (мимо кэша)
+    и та же строка через LIKE"""
+    results = {}
+    for term in SEARCH_TERMS:
+        results[f'поиск "{term}", мс'] = timed(lambda: repository.query_page(term, False), repeat)[0]
+        results[f'поиск LIKE "{term}", мс'] = timed(lambda: like_search(repository, term), repeat)[0]
+    return results
+
+
+def bench_pages(repository):
+    """Листает каждый вид таблицы вперед и назад; среднее время страницы"""
+    results = {}
+    for sort, descending, filters in PAGE_VIEWS:
+        name = f'страница {sort}{" desc" if descending else ""}{" +фильтр" if filters else ""}, мс'
+        started = time.perf_counter()
+        after, keys, pages = None, [], 0
+        for _ in range(PAGES_PER_VIEW):
+            page, _ = repository.read_page(None, False, after=after, sort=sort,
+                                           descending=descending, filters=filters)
+            pages += 1
+            if len(page) < PAGE_SIZE:
+                break
+            after = page[-1][0]
+            keys.append(page[0][0])
+        for before in reversed(keys[1:]):
+            repository.read_page(None, False, before=before, sort=sort,
+                                 descending=descending, filters=filters)
+            pages += 1
+        results[name] = (time.perf_counter() - started) * 1000 / pages
+    return results
+
+
+def bench_update(repository, size, repeat):
+    """Обновление записей по одной и одним групповым изменением"""
+    rnd = random.Random(2)
+    part_ids = rnd.sample(range(1, size + 1), min(UPDATE_ROWS, size))
+    rows = repository.get_many(part_ids)
+    started = time.perf_counter()
+    for row in rows:
+        repository.update(row[0], (row[1], row[2], row[3] + 1, row[4], row[5], row[6], row[7]))
+    single = (time.perf_counter() - started) * 1000 / len(rows)
+
+    bulk_ids = rnd.sample(range(1, size + 1), min(BULK_UPDATE_ROWS, size))
+    bulk, _ = timed(lambda: repository.update_fields(bulk_ids, {'price': 99.0}), repeat)
+    return {
+        'update одной записи, мс': single,
+        f'update_fields {len(bulk_ids)} записей, мс': bulk,
+    }
+
+
+def run(size, repeat):
+    """Все замеры на свежей базе из size строк"""
+    with tempfile.TemporaryDirectory() as tmp:
+        repository = PartsRepository.open(os.path.join(tmp, 'bench.db'))
+        try:
+            results = bench_insert(repository, size)
+            results.update(bench_search(repository, repeat))
+            results.update(bench_pages(repository))
+            results.update(bench_update(repository, size, repeat))
+        finally:
+            repository.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000',
+                        help='размеры синтетических баз через запятую')
+    parser.add_argument('--repeat', type=int, default=3, help='повторов каждого запроса')
+    parser.add_argument('--save', help='сохранить результаты в JSON')
+    parser.add_argument('--compare', help='сравнить с результатами из JSON')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='допустимое замедление относительно --compare (доля)')
+    parser.add_argument('--min-delta', type=float, default=1.0,
+                        help='меньшее замедление в мс считается шумом')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    results, regressions = {}, []
+    for size in (int(size) for size in args.sizes.split(',')):
+        print(f'\nБаза из {size} строк')
+        results[str(size)] = run(size, args.repeat)
+        for name, value in results[str(size)].items():
+            line = f'  {name:<48}{value:>10.2f}'
+            previous = baseline.get(str(size), {}).get(name)
+            if previous:
+                change = value / previous - 1
+                line += f'{change:>+10.0%}'
+                if change > args.tolerance and value - previous > args.min_delta:
+                    line += '  ЗАМЕДЛЕНИЕ'
+                    regressions.append((size, name))
+            print(line)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if regressions:
+        print(f'\nЗамедлилось замеров: {len(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Сжатые снимки базы без повторов: каждый снимок хранит только изменившиеся куски файла.
+
+Снимок — согласованная копия базы (PartsRepository.backup), разрезанная на
+куски по SNAPSHOT_CHUNK_SIZE. Кусок хранится один раз, сжатым zlib, под именем
+своего SHA-256; опись снимка (JSON) перечисляет куски по порядку. SQLite
+меняет файл постранично, поэтому следующий снимок после правки нескольких
+записей дописывает в хранилище лишь несколько кусков.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zlib
+from datetime import datetime
+
+from parts_repository import replacing_file
+
+SNAPSHOT_CHUNK_SIZE = 256 * 1024  # Размер куска; кратен размеру страницы SQLite
+# Уровень сжатия zlib: на базах запчастей 1 вчетверо быстрее 6 при кусках больше на ~15%,
+# а снимок занимает поток базы, пока не запишет все куски
+SNAPSHOT_COMPRESSION = 1
+SNAPSHOT_KEEP = 20  # Сколько последних снимков хранить; куски старых удаляются
+
+
+def snapshot_dir(db_path):
+    """Каталог снимков базы db_path: рядом с ней"""
+    return db_path + '.snapshots'
+
+
+def chunk_path(directory, digest):
+    return os.path.join(directory, 'chunks', digest[:2], digest)
+
+
+def write_atomic(path, data):
+    """Пишет data в файл path целиком или не пишет вовсе"""
+    with replacing_file(path) as partial_path, open(partial_path, 'wb') as f:
+        f.write(data)
+
+
+def list_snapshots(directory):
+    """Описи снимков в каталоге, от старых к новым"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                  if name.startswith('snapshot-') and name.endswith('.json'))
+
+
+def prune_snapshots(directory, keep=SNAPSHOT_KEEP):
+    """Удаляет старые снимки сверх keep и куски, на которые не ссылается ни один оставшийся"""
+    manifests = list_snapshots(directory)
+    for path in manifests[:-keep]:
+        os.remove(path)
+    used = set()
+    for path in manifests[-keep:]:
+        with open(path, encoding='utf-8') as f:
+            used.update(json.load(f)['chunks'])
+    removed = 0
+    for root, _, names in os.walk(os.path.join(directory, 'chunks')):
+        for name in names:
+            if name not in used:
+                os.remove(os.path.join(root, name))
+                removed += 1
+    return removed
+
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(directory) for name in names)
+
+
+def write_snapshot(repository, directory, *, progress):
+    """Делает снимок открытой базы в каталог directory и возвращает статистику.
+
+    Копия базы снимается online backup API во временный файл в том же каталоге
+    и удаляется после того, как ее куски записаны.
+    """
+    started = time.perf_counter()
+    os.makedirs(os.path.join(directory, 'chunks'), exist_ok=True)
+    handle, copy_path = tempfile.mkstemp(suffix='.db', dir=directory)
+    os.close(handle)
+    try:
+        repository.backup(copy_path, lambda text, fraction: progress(
+            f"копирование базы: {text}", None if fraction is None else fraction / 2))
+        size = os.path.getsize(copy_path)
+        digests, new_chunks, written = [], 0, 0
+        whole = hashlib.sha256()
+        with open(copy_path, 'rb') as f:
+            while True:
+                data = f.read(SNAPSHOT_CHUNK_SIZE)
+                if not data:
+                    break
+                whole.update(data)
+                digest = hashlib.sha256(data).hexdigest()
+                digests.append(digest)
+                path = chunk_path(directory, digest)
+                if not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    compressed = zlib.compress(data, SNAPSHOT_COMPRESSION)
+                    write_atomic(path, compressed)
+                    new_chunks += 1
+                    written += len(compressed)
+                done = len(digests) * SNAPSHOT_CHUNK_SIZE
+                progress(f"записано кусков: {len(digests)}, новых: {new_chunks}", 0.5 + min(done / size, 1) / 2)
+    finally:
+        os.remove(copy_path)
+
+    created = datetime.now()
+    manifest = {
+        'created': created.strftime("%Y-%m-%d %H:%M:%S"),
+        'bytes': size,
+        'sha256': whole.hexdigest(),
+        'chunk_size': SNAPSHOT_CHUNK_SIZE,
+        'chunks': digests,
+    }
+    manifest_path = os.path.join(directory, created.strftime("snapshot-%Y%m%d-%H%M%S-%f.json"))
+    write_atomic(manifest_path, json.dumps(manifest, indent=1).encode('utf-8'))
+    prune_snapshots(directory)
+    return {
+        'path': manifest_path,
+        'seconds': time.perf_counter() - started,
+        'bytes': size,
+        'chunks': len(digests),
+        'new_chunks': new_chunks,
+        'written': written,
+        'store_bytes': directory_size(directory),
+        'snapshots': len(list_snapshots(directory)),
+    }
+
+
+def restore_snapshot(manifest_path, path, *, progress):
+    """Собирает базу из снимка manifest_path в файл path, проверяя контрольные суммы"""
+    # Рядом с базой остался журнал (WAL или отката): SQLite применил бы его к восстановленному файлу
+    if os.path.exists(path + '-wal') or os.path.exists(path + '-journal'):
+        raise ValueError(f"База {os.path.basename(path)} открыта или закрыта с ошибкой: выберите другой файл")
+    started = time.perf_counter()
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    directory = os.path.dirname(manifest_path)
+    total = len(manifest['chunks'])
+    whole = hashlib.sha256()
+    with replacing_file(path) as partial_path:
+        with open(partial_path, 'wb') as out:
+            for number, digest in enumerate(manifest['chunks'], start=1):
+                try:
+                    with open(chunk_path(directory, digest), 'rb') as f:
+                        data = zlib.decompress(f.read())
+                except (OSError, zlib.error) as e:
+                    raise ValueError(f"Снимок поврежден: кусок {digest[:12]} недоступен ({e})")
+                if hashlib.sha256(data).hexdigest() != digest:
+                    raise ValueError(f"Снимок поврежден: кусок {digest[:12]} не совпадает с контрольной суммой")
+                whole.update(data)
+                out.write(data)
+                progress(f"восстановлено кусков: {number} из {total}", number / total)
+        if whole.hexdigest() != manifest['sha256']:
+            raise ValueError("Снимок поврежден: собранный файл не совпадает с контрольной суммой")
+    return {'seconds': time.perf_counter() - started, 'bytes': manifest['bytes'], 'created': manifest['created']}
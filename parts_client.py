@@ -0,0 +1,241 @@
+"""Хранилище запчастей на сервере parts_server.py с тем же набором методов, что у PartsRepository.
+
+DatabaseWorker вызывает методы хранилища по имени, поэтому окно программы
+работает с RemoteRepository так же, как с файлом базы. Ответы на чтение
+запоминаются вместе с ETag и при повторном запросе переспрашиваются
+через If-None-Match: если база не менялась, сервер отвечает 304 без тела.
+"""
+import json
+import socket
+import sqlite3
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from urllib.parse import urlencode, urlsplit
+
+from parts_repository import (EXPORT_CHUNK_SIZE, IMPORT_BATCH_SIZE, LOW_STOCK_LIMIT, PAGE_SIZE, ConflictError,
+                              MovementRow, Page, PageKey, PartRow, PartValues, page_key)
+
+DEFAULT_PORT = 8765  # Порт сервера parts_server.py по умолчанию
+REQUEST_TIMEOUT = 60  # Секунд ждем ответа сервера
+RESPONSE_CACHE_SIZE = 64  # Сколько ответов с ETag помним
+
+
+class RemoteError(RuntimeError):
+    """Ошибка, которую вернул сервер"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"Сервер ответил {status}: {message}")
+        self.status = status
+
+
+def is_server_url(path: str) -> bool:
+    """Адрес сервера вместо пути к файлу базы"""
+    return path.startswith(('http://', 'https://'))
+
+
+class RemoteRepository:
+    """Клиент API parts_server.py. Как и PartsRepository, используется из одного потока"""
+
+    def __init__(self, url: str):
+        # http.client тянет за собой ssl и email: импортируем при подключении,
+        # а не при запуске программы, которая работает с файлом
+        import http.client
+        self.http = http.client
+        parts = urlsplit(url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        # Одно соединение keep-alive на все запросы
+        self.connection = connection_class(parts.netloc, timeout=REQUEST_TIMEOUT)
+        self.prefix = parts.path.rstrip('/')
+        self.responses = OrderedDict()  # Адрес -> (ETag, ответ): LRU ответов на чтение
+        self.generation_seen = None  # generation при прошлом вызове changes
+
+    @classmethod
+    def open(cls, url: str) -> 'RemoteRepository':
+        """Подключается к серверу; проверяет, что он отвечает"""
+        repository = cls(url)
+        repository.generation()
+        return repository
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def interrupt(self) -> None:
+        """Обрывает соединение, чтобы выполняющийся запрос завершился ошибкой"""
+        if self.connection.sock:
+            try:
+                self.connection.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def invalidate(self) -> None:
+        self.responses.clear()
+
+    def request(self, method: str, path: str, query: Optional[Dict[str, object]] = None,
+                body: Optional[object] = None, headers: Optional[Dict[str, str]] = None) -> Optional[dict]:
+        """Выполняет запрос и возвращает JSON ответа; ошибки сервера поднимает исключениями"""
+        url = self.prefix + path
+        if query:
+            url += '?' + urlencode({name: value for name, value in query.items() if value is not None})
+        headers = dict(headers or {})
+        cached = self.responses.get(url) if method == 'GET' else None
+        if cached:
+            headers['If-None-Match'] = cached[0]
+        data = None
+        if body is not None:
+            data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            headers['Content-Type'] = 'application/json; charset=utf-8'
+        try:
+            self.connection.request(method, url, data, headers)
+            response = self.connection.getresponse()
+            payload = response.read()
+        except (self.http.HTTPException, OSError):
+            self.connection.close()  # Следующий запрос откроет соединение заново
+            raise
+
+        if response.status == 304 and cached:
+            self.responses.move_to_end(url)
+            return cached[1]
+        result = json.loads(payload) if payload else None
+        if response.status >= 400:
+            error = (result or {}).get('error', response.reason)
+            if response.status == 412:
+                part = result.get('part')
+                raise ConflictError(tuple(part) if part else None, result.get('version'))
+            if response.status == 409 and result.get('integrity'):
+                raise sqlite3.IntegrityError(error)
+            if response.status == 400:
+                raise ValueError(error)
+            raise RemoteError(response.status, error)
+        etag = response.getheader('ETag')
+        if method == 'GET' and etag:
+            self.responses[url] = (etag, result)
+            if len(self.responses) > RESPONSE_CACHE_SIZE:
+                self.responses.popitem(last=False)
+        return result
+
+    def generation(self) -> int:
+        return self.request('GET', '/generation')['generation']
+
+    def count(self) -> int:
+        return self.count_rows()
+
+    def get(self, part_id: int) -> Optional[PartRow]:
+        result = self.get_versioned(part_id)
+        return result[0] if result else None
+
+    def get_versioned(self, part_id: int) -> Optional[Tuple[PartRow, int]]:
+        try:
+            result = self.request('GET', f'/parts/{int(part_id)}')
+        except RemoteError as e:
+            if e.status == 404:
+                return None
+            raise
+        return tuple(result['part']), result['version']
+
+    def add(self, values: PartValues) -> PartRow:
+        return tuple(self.request('POST', '/parts', body={'values': values})['part'])
+
+    def update(self, part_id: int, values: PartValues, shown_quantity: Optional[int] = None,
+               version: Optional[int] = None) -> Optional[PartRow]:
+        headers = {'If-Match': f'"v{version}"'} if version is not None else None
+        result = self.request('PUT', f'/parts/{int(part_id)}', headers=headers,
+                              body={'values': values, 'shown_quantity': shown_quantity})
+        return tuple(result['part'])
+
+    def delete(self, part_ids: Iterable[int]) -> None:
+        self.request('DELETE', '/parts', body={'ids': [int(i) for i in part_ids]})
+
+    def update_fields(self, part_ids: Iterable[int], changes: Dict[str, object]) -> List[PartRow]:
+        result = self.request('PATCH', '/parts', body={'ids': [int(i) for i in part_ids], 'changes': changes})
+        return [tuple(row) for row in result['parts']]
+
+    def insert_many(self, rows: Sequence[PartValues], update_existing: bool = True) -> Tuple[int, int]:
+        result = self.request('POST', '/parts/bulk', body={'rows': list(rows), 'update_existing': update_existing})
+        return result['inserted'], result['existing']
+
+    def upsert_stream(self, records: Iterable[Tuple[PartValues, Optional[float]]],
+                      progress: Callable[[str, Optional[float]], None]) -> Tuple[int, int]:
+        """Отправляет записи пачками по IMPORT_BATCH_SIZE; каждая пачка — своя транзакция на сервере"""
+        batch, inserted, updated = [], 0, 0
+        for values, fraction in records:
+            batch.append(values)
+            if len(batch) == IMPORT_BATCH_SIZE:
+                added, existing = self.insert_many(batch)
+                inserted, updated, batch = inserted + added, updated + existing, []
+                progress(f"загружено строк: {inserted + updated}", fraction)
+        if batch:
+            added, existing = self.insert_many(batch)
+            inserted, updated = inserted + added, updated + existing
+        return inserted, updated
+
+    def record_movement(self, part_id: int, kind: str, quantity: int, reason: str = '') -> PartRow:
+        result = self.request('POST', f'/parts/{int(part_id)}/movements',
+                              body={'kind': kind, 'quantity': quantity, 'reason': reason})
+        return tuple(result['part'])
+
+    def movements(self, part_id: int, limit: int = 1000) -> List[MovementRow]:
+        result = self.request('GET', f'/parts/{int(part_id)}/movements', {'limit': limit})
+        return [tuple(row) for row in result['movements']]
+
+    def stock_at(self, part_id: int, ts: str) -> int:
+        return self.request('GET', f'/parts/{int(part_id)}/stock', {'at': ts})['stock']
+
+    def count_rows(self, search_term: Optional[str] = None, filters: Optional[Dict[str, object]] = None,
+                   limit: Optional[int] = None) -> int:
+        query = self.selection_query(search_term, filters)
+        query['limit'] = limit
+        return self.request('GET', '/parts/count', query)['count']
+
+    def iter_rows(self, search_term: Optional[str] = None, sort: str = 'id', descending: bool = False,
+                  filters: Optional[Dict[str, object]] = None,
+                  chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[PartRow]]:
+        """Все записи выборки в порядке таблицы: страницами по chunk_size строк"""
+        ranked, after = False, None
+        while True:
+            page, ranked = self.read_page(search_term, ranked, after, None, sort, descending, filters, chunk_size)
+            if page:
+                yield [row for _, row in page]
+            if len(page) < chunk_size:
+                break
+            after = page[-1][0]
+
+    def set_min_quantity(self, part_ids: Iterable[int], min_quantity: Optional[int]) -> None:
+        self.request('POST', '/parts/min-quantity',
+                     body={'ids': [int(i) for i in part_ids], 'min_quantity': min_quantity})
+
+    def dashboard(self, low_stock_limit: int = LOW_STOCK_LIMIT) -> Dict[str, object]:
+        return self.request('GET', '/dashboard')
+
+    def suppliers(self) -> List[str]:
+        return self.request('GET', '/suppliers')['suppliers']
+
+    def changes(self, since: int, part_ids: Iterable[int]) -> Optional[Tuple[int, List[PartRow], List[int]]]:
+        """Как PartsRepository.changes; дешевая проверка — номер generation на сервере"""
+        generation = self.generation()
+        if generation == self.generation_seen:
+            return None
+        self.generation_seen = generation
+        result = self.request('POST', '/parts/changes', body={'since': since, 'ids': [int(i) for i in part_ids]})
+        return result['generation'], [tuple(row) for row in result['parts']], result['deleted']
+
+    def read_page(self, search_term: str, ranked: bool, after: Optional[PageKey] = None,
+                  before: Optional[PageKey] = None, sort: str = 'id', descending: bool = False,
+                  filters: Optional[Dict[str, object]] = None, page_size: int = PAGE_SIZE) -> Tuple[Page, bool]:
+        query = self.selection_query(search_term, filters)
+        query.update({
+            'ranked': '1' if ranked else None,
+            'after': None if after is None else json.dumps(after),
+            'before': None if before is None else json.dumps(before),
+            'sort': sort,
+            'desc': '1' if descending else None,
+            'limit': page_size,
+        })
+        result = self.request('GET', '/parts', query)
+        return [(page_key(key), tuple(row)) for key, row in result['items']], result['ranked']
+
+    def selection_query(self, search_term: Optional[str],
+                        filters: Optional[Dict[str, object]]) -> Dict[str, Union[str, None]]:
+        return {
+            'search': search_term or None,
+            'filters': json.dumps(filters, ensure_ascii=False, sort_keys=True) if filters else None,
+        }
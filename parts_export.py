@@ -0,0 +1,107 @@
+"""Потоковая выгрузка записей parts в CSV, XLSX и Parquet/Arrow."""
+import csv
+import os
+import time
+
+from parts_repository import PART_COLUMNS, replacing_file
+
+# Заголовки столбцов в выгрузке, как в таблице программы; импорт узнает их обратно
+EXPORT_TITLES = ['ID', 'Название', 'Артикул', 'Количество', 'Цена', 'Поставщик', 'Описание',
+                 'Дата добавления']
+
+
+def write_csv(path, chunks):
+    """Пишет CSV для Excel: UTF-8 с BOM, поля через точку с запятой"""
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(EXPORT_TITLES)
+        for rows in chunks:
+            writer.writerows(rows)
+
+
+def write_xlsx(path, chunks):
+    """Пишет XLSX в потоковом режиме openpyxl, не держа весь лист в памяти"""
+    try:
+        import openpyxl
+    except ImportError:
+        raise RuntimeError("Для выгрузки в XLSX установите пакет openpyxl: pip install openpyxl")
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Запчасти")
+    sheet.append(EXPORT_TITLES)
+    for rows in chunks:
+        for row in rows:
+            sheet.append(row)
+    workbook.save(path)
+
+
+def arrow_schema(pa):
+    """Типы столбцов PART_COLUMNS для Parquet/Arrow"""
+    types = [pa.int64(), pa.string(), pa.string(), pa.int64(), pa.float64(), pa.string(),
+             pa.string(), pa.string()]
+    return pa.schema(list(zip(PART_COLUMNS, types)))
+
+
+def write_arrow(path, chunks, parquet):
+    """Пишет Parquet (parquet=True) или файл Arrow IPC: каждая пачка — отдельная группа строк"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Для выгрузки в Parquet/Arrow установите пакет pyarrow: pip install pyarrow")
+
+    schema = arrow_schema(pa)
+    writer = pq.ParquetWriter(path, schema) if parquet else pa.ipc.new_file(path, schema)
+    try:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            batch = pa.record_batch([pa.array(column, type=field.type)
+                                     for column, field in zip(columns, schema)], schema=schema)
+            if parquet:
+                writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                writer.write_batch(batch)
+    finally:
+        writer.close()
+
+
+WRITERS = {
+    '.csv': write_csv,
+    '.xlsx': write_xlsx,
+    '.parquet': lambda path, chunks: write_arrow(path, chunks, parquet=True),
+    '.arrow': lambda path, chunks: write_arrow(path, chunks, parquet=False),
+    '.feather': lambda path, chunks: write_arrow(path, chunks, parquet=False),
+}
+
+
+def export_file(repository, path, search_term=None, sort='id', descending=False, filters=None, *,
+                progress):
+    """Выгружает выборку (поиск search_term и фильтры filters, порядок как в таблице) в файл.
+
+    Формат выбирается по расширению path. Записи читаются пачками, поэтому память
+    не зависит от размера выборки; недовыгруженный файл не заменяет прежний.
+    Возвращает словарь со статистикой.
+    """
+    writer = WRITERS.get(os.path.splitext(path)[1].lower())
+    if writer is None:
+        raise ValueError(f"Неизвестный формат файла: {os.path.basename(path)}")
+
+    started = time.perf_counter()
+    total = repository.count_rows(search_term, filters)
+    written = 0
+
+    def chunks():
+        nonlocal written
+        progress("подготовка", 0)
+        for rows in repository.iter_rows(search_term, sort, descending, filters):
+            yield rows
+            written += len(rows)
+            progress(f"выгружено строк: {written} из {total}", written / total if total else None)
+
+    with replacing_file(path) as partial_path:
+        writer(partial_path, chunks())
+    return {
+        'rows': written,
+        'seconds': time.perf_counter() - started,
+        'bytes': os.path.getsize(path),
+    }
@@ -0,0 +1,160 @@
+"""Разбор прайс-листов CSV/XLSX и строк из буфера обмена в записи parts."""
+import csv
+import io
+import os
+import time
+
+from parts_repository import PART_FIELDS, timestamp
+
+# Заголовки столбцов в прайс-листах поставщиков -> поле parts
+IMPORT_HEADERS = {
+    'название': 'name', 'наименование': 'name', 'name': 'name',
+    'артикул': 'part_number', 'part_number': 'part_number', 'код': 'part_number',
+    'количество': 'quantity', 'кол-во': 'quantity', 'остаток': 'quantity', 'quantity': 'quantity',
+    'цена': 'price', 'price': 'price',
+    'поставщик': 'supplier', 'supplier': 'supplier',
+    'описание': 'description', 'description': 'description',
+}
+
+
+def parse_quantity(value):
+    """Количество — целое число; 5.0 и "5,0" из Excel тоже принимаем, а 5.5 — нет"""
+    if isinstance(value, str):
+        value = value.strip().replace(',', '.')
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(f"количество должно быть целым: {value}")
+    return int(number)
+
+
+def parse_part(fields, date_added):
+    """Проверяет поля записи (в порядке PART_FIELDS) так же, как AddEditDialog.save"""
+    name, part_number, quantity, price, supplier, description = (
+        '' if value is None else value for value in fields
+    )
+    name = str(name).strip()
+    if not name:
+        raise ValueError("не заполнено название")
+    if isinstance(price, str):
+        price = price.replace(',', '.')  # В русских прайс-листах дробная часть через запятую
+    return (
+        name,
+        str(part_number).strip() or None,  # Пустой артикул не должен сливать записи при UPSERT
+        parse_quantity(quantity),
+        float(price),
+        str(supplier),
+        str(description),
+        date_added
+    )
+
+
+def detect_encoding(path):
+    """Отличает UTF-8 от cp1251, в которой Excel сохраняет CSV в русской Windows"""
+    with open(path, 'rb') as f:
+        sample = f.read(64 * 1024)
+    try:
+        sample.decode('utf-8-sig')
+    except UnicodeDecodeError as e:
+        if e.start < len(sample) - 3:  # Обрезанный в конце образца символ не в счет
+            return 'cp1251'
+    return 'utf-8-sig'
+
+
+def read_csv_rows(path):
+    """Построчно читает CSV: (номер строки, поля, доля прочитанного файла)"""
+    size = os.path.getsize(path) or 1
+    with open(path, newline='', encoding=detect_encoding(path)) as f:
+        # Угадываем только разделитель: остальное, как у Excel. Sniffer по образцу
+        # без "" внутри полей решает, что кавычки не удваиваются, и портит их
+        try:
+            delimiter = csv.Sniffer().sniff(f.read(64 * 1024), delimiters=';,\t').delimiter
+        except csv.Error:
+            delimiter = csv.excel.delimiter
+        f.seek(0)
+        for number, fields in enumerate(csv.reader(f, csv.excel, delimiter=delimiter), start=1):
+            yield number, fields, f.buffer.tell() / size
+
+
+def read_xlsx_rows(path):
+    """Построчно читает первый лист XLSX: (номер строки, поля, доля прочитанного)"""
+    try:
+        import openpyxl
+    except ImportError:
+        raise RuntimeError("Для импорта XLSX установите пакет openpyxl: pip install openpyxl")
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        total = sheet.max_row
+        for number, fields in enumerate(sheet.iter_rows(values_only=True), start=1):
+            yield number, list(fields), number / total if total else None
+    finally:
+        workbook.close()
+
+
+def header_columns(fields):
+    """Если строка — заголовок, возвращает номер столбца для каждого поля PART_FIELDS"""
+    names = [IMPORT_HEADERS.get(str(field or '').strip().lower()) for field in fields]
+    if 'name' not in names:
+        return None
+    return [names.index(field) if field in names else None for field in PART_FIELDS]
+
+
+def parse_records(records, date_added, rejected):
+    """Превращает строки файла или буфера обмена в значения для INSERT.
+
+    records — пары (номер строки, поля, доля прочитанного); выдает пары
+    (значения, доля прочитанного). Столбцы берутся из строки заголовка, иначе
+    по порядку: либо как в таблице программы (ID первым), либо как PART_FIELDS.
+    Строки с ошибками попадают в rejected как (номер строки, причина).
+    """
+    columns = None  # Номера столбцов для полей PART_FIELDS
+    for number, fields, fraction in records:
+        if columns is None:
+            columns = header_columns(fields)
+            if columns:
+                continue
+            if len(fields) > len(PART_FIELDS) and str(fields[0]).strip().isdigit():
+                columns = list(range(1, len(PART_FIELDS) + 1))  # Строка, скопированная из таблицы
+            else:
+                columns = list(range(len(PART_FIELDS)))
+        if not any(field not in (None, '') for field in fields):
+            continue
+
+        values = [fields[i] if i is not None and i < len(fields) else None for i in columns]
+        try:
+            yield parse_part(values, date_added), fraction
+        except (ValueError, TypeError) as e:
+            rejected.append((number, str(e)))
+
+
+def clipboard_records(text):
+    """Разбирает текст из буфера обмена (строки через перевод строки, поля через Tab)"""
+    rows = csv.reader(io.StringIO(text), delimiter='\t')
+    return ((number, fields, None) for number, fields in enumerate(rows, start=1))
+
+
+def clipboard_text(rows):
+    """Текст для буфера обмена, который clipboard_records разберет обратно: поля с Tab,
+    переводами строк или кавычками берутся в кавычки, как это делает Excel"""
+    out = io.StringIO()
+    csv.writer(out, delimiter='\t', lineterminator='\n').writerows(rows)
+    return out.getvalue().rstrip('\n')
+
+
+def import_file(repository, path, progress):
+    """Потоково загружает прайс-лист CSV/XLSX, обновляя записи с тем же артикулом.
+
+    Возвращает словарь со статистикой и списком отклоненных строк
+    (номер строки, причина).
+    """
+    reader = read_xlsx_rows if path.lower().endswith(('.xlsx', '.xlsm')) else read_csv_rows
+    started = time.perf_counter()
+    rejected = []
+    inserted, updated = repository.upsert_stream(parse_records(reader(path), timestamp(), rejected), progress)
+    return {
+        'inserted': inserted,
+        'updated': updated,
+        'rejected': rejected,
+        'seconds': time.perf_counter() - started,
+    }
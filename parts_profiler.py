@@ -0,0 +1,191 @@
+"""Замеры времени запросов к базе и обновлений окна (включаются по желанию).
+
+PROFILER копит по каждой операции последние PROFILE_SAMPLES замеров и
+отдает p50/p95. Соединения PartsRepository открываются с ProfiledConnection:
+пока профилирование выключено, ее курсор только проверяет флаг. Операции
+медленнее SLOW_OPERATION_MS пишутся в журнал SLOW_LOG_PATH (с ротацией)
+вместе с текстом запроса и его EXPLAIN QUERY PLAN.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+PROFILE_SAMPLES = 1000  # Сколько последних замеров операции храним для перцентилей
+SLOW_OPERATION_MS = 200  # Операции дольше этого попадают в журнал медленных
+SLOW_LOG_PATH = os.path.join(os.path.expanduser("~"), ".parts_app_slow.log")
+SLOW_LOG_BYTES = 1024 * 1024  # Размер файла журнала до ротации
+SLOW_LOG_BACKUPS = 3  # Сколько старых файлов журнала держим
+SQL_LABEL_LENGTH = 90  # Сколько символов запроса показываем в названии операции
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Значение из отсортированного списка samples, ниже которого доля fraction замеров"""
+    return samples[min(int(fraction * len(samples)), len(samples) - 1)]
+
+
+def sql_label(sql: str) -> str:
+    """Короткое название операции по тексту запроса: длинный список столбцов SELECT опускаем"""
+    text = ' '.join(sql.split())
+    columns = re.match(r'SELECT (.+?) FROM ', text)
+    if columns and len(columns.group(1)) > 30:
+        text = 'SELECT … FROM ' + text[columns.end():]
+    return 'SQL: ' + (text if len(text) <= SQL_LABEL_LENGTH else text[:SQL_LABEL_LENGTH - 1] + '…')
+
+
+class Profiler:
+    """Замеры операций по названиям; можно вызывать из любого потока"""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.samples: Dict[str, deque] = {}  # Операция -> deque(мс)
+        self.rows: Dict[str, int] = {}  # Операция -> сколько строк всего прочитано или показано
+        self.slow_log = None  # logging.Logger журнала медленных операций
+
+    def enable(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        if enabled and self.slow_log is None:
+            # logging нужен только при профилировании: не замедляем им запуск программы
+            import logging
+            import logging.handlers
+            self.slow_log = logging.getLogger('parts.slow')
+            self.slow_log.propagate = False
+            try:
+                handler = logging.handlers.RotatingFileHandler(
+                    SLOW_LOG_PATH, maxBytes=SLOW_LOG_BYTES, backupCount=SLOW_LOG_BACKUPS, encoding='utf-8'
+                )
+            except OSError:
+                handler = logging.NullHandler()  # Замеры в окне статистики останутся и без файла
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self.slow_log.addHandler(handler)
+            self.slow_log.setLevel(logging.INFO)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.samples.clear()
+            self.rows.clear()
+
+    def record(self, operation: str, seconds: float, rows: Optional[int] = None,
+               details: Optional[Callable[[], str]] = None) -> None:
+        """Добавляет замер; медленную операцию пишет в журнал вместе с details()"""
+        elapsed = seconds * 1000
+        with self.lock:
+            self.samples.setdefault(operation, deque(maxlen=PROFILE_SAMPLES)).append(elapsed)
+            if rows is not None:
+                self.rows[operation] = self.rows.get(operation, 0) + rows
+        if elapsed >= SLOW_OPERATION_MS and self.slow_log:
+            message = f"{elapsed:.0f} мс  {operation}"
+            if rows is not None:
+                message += f"  строк: {rows}"
+            if details:
+                message += "\n" + details()
+            self.slow_log.info(message)
+
+    @contextmanager
+    def measure(self, operation: str, rows: Optional[int] = None) -> Iterator[None]:
+        """with PROFILER.measure('Таблица: ...', rows=n): — замер блока кода"""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(operation, time.perf_counter() - started, rows)
+
+    def stats(self) -> List[Tuple[str, int, float, float, float, Optional[int]]]:
+        """[(операция, вызовов, p50, p95, максимум в мс, строк)] — самые долгие по p95 первыми"""
+        with self.lock:
+            snapshot = [(operation, sorted(samples), self.rows.get(operation))
+                        for operation, samples in self.samples.items()]
+        result = [(operation, len(samples), percentile(samples, 0.5), percentile(samples, 0.95), samples[-1], rows)
+                  for operation, samples, rows in snapshot]
+        return sorted(result, key=lambda item: item[3], reverse=True)
+
+
+PROFILER = Profiler()
+
+
+def query_plan(connection: sqlite3.Connection, sql: str, params) -> str:
+    """EXPLAIN QUERY PLAN запроса для журнала медленных операций"""
+    try:
+        plan = connection.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    except sqlite3.Error as e:
+        return f"  (план недоступен: {e})"
+    return '\n'.join(f"  {row[-1]}" for row in plan)
+
+
+def describe_query(connection: sqlite3.Connection, sql: str, params) -> str:
+    """Текст запроса, параметры и план; вызывается только для медленных запросов"""
+    text = ' '.join(sql.split())
+    shown = repr(params)
+    if len(shown) > 300:
+        shown = shown[:300] + '…'
+    details = f"  {text}\n  параметры: {shown}"
+    if text.upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')):
+        details += "\n" + query_plan(connection, sql, params)
+    return details
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Курсор, который при включенном PROFILER замеряет выполнение запросов и чтение строк"""
+
+    def execute(self, sql, params=()):
+        if not PROFILER.enabled:
+            return super().execute(sql, params)
+        self.profiled_sql, self.profiled_params = sql, params
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            # Текст и план нужны только медленным запросам; план читаем отдельным курсором
+            PROFILER.record(sql_label(sql), time.perf_counter() - started,
+                            details=lambda: describe_query(self.connection, sql, params))
+
+    def executemany(self, sql, seq_of_params):
+        if not PROFILER.enabled:
+            return super().executemany(sql, seq_of_params)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_params)
+        finally:
+            PROFILER.record(sql_label(sql) + ' (executemany)', time.perf_counter() - started,
+                            rows=self.rowcount if self.rowcount >= 0 else None)
+
+    def fetch(self, method, *args):
+        if not PROFILER.enabled:
+            return method(*args)
+        started = time.perf_counter()
+        result = method(*args)
+        sql, params = getattr(self, 'profiled_sql', ''), getattr(self, 'profiled_params', ())
+        PROFILER.record('Чтение строк: ' + sql_label(sql)[5:], time.perf_counter() - started,
+                        rows=len(result) if isinstance(result, list) else int(result is not None),
+                        details=lambda: describe_query(self.connection, sql, params))
+        return result
+
+    def fetchall(self):
+        return self.fetch(super().fetchall)
+
+    def fetchmany(self, size=None):
+        return self.fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchone(self):
+        return self.fetch(super().fetchone)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Соединение, все курсоры которого — ProfiledCursor"""
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
@@ -0,0 +1,1076 @@
+"""Хранилище запчастей: единственное описание схемы базы и все запросы к ней.
+
+Модуль не зависит от интерфейса, поэтому запросы можно выполнять и замерять
+из скриптов без экрана (см. benchmark.py). Окно программы вызывает методы
+PartsRepository в фоновом потоке через DatabaseWorker.
+"""
+import json
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from parts_profiler import ProfiledConnection
+
+PAGE_SIZE = 200  # Сколько строк читаем из базы за один запрос
+# Выдачу поиска сортируем по релевантности, только если в ней не больше стольких строк;
+# более широкие запросы отдаются в порядке id, чтобы не ранжировать всю таблицу
+RANKED_SEARCH_LIMIT = 5000
+# Если фильтрам по столбцам отвечает больше стольких строк, страницу выгоднее читать
+# по индексу сортировки, отбрасывая лишнее, чем выбирать по индексу фильтра и сортировать
+WIDE_FILTER_LIMIT = 5000
+SEARCH_CACHE_SIZE = 64  # Сколько последних страниц поиска помним
+EXPORT_CHUNK_SIZE = 10000  # Строк выгрузки, которые fetchmany читает за раз
+
+IMPORT_BATCH_SIZE = 5000  # Строк импорта в одном executemany
+IMPORT_COMMIT_ROWS = IMPORT_BATCH_SIZE * 20  # Строк импорта в одной транзакции
+STATEMENT_CACHE_SIZE = 256  # Сколько подготовленных запросов sqlite3 держит на соединении
+BUSY_TIMEOUT = 5.0  # Сколько секунд запрос ждет, пока базу держит запись другого пользователя
+LOCK_RETRIES = 3  # Сколько раз повторяем запись, если база так и осталась занята
+LOCK_RETRY_DELAY = 0.5  # Пауза перед первым повтором, с каждым повтором удваивается
+# Настройки, применяемые к каждому открытому соединению
+CONNECTION_PRAGMAS = [
+    # Новые базы отдают место удаленных строк через PRAGMA incremental_vacuum;
+    # на существующих не действует, пока их не перестроит vacuum()
+    'PRAGMA auto_vacuum = INCREMENTAL',
+    'PRAGMA cache_size = -65536',  # 64 МБ кэша страниц
+    'PRAGMA temp_store = MEMORY',
+]
+# Режим журнала зависит от того, где лежит база. WAL держит индекс журнала в разделяемой
+# памяти (файл -shm), которая не работает между компьютерами, поэтому база на сетевом
+# диске, которую открывают несколько человек, работает с журналом отката и блокировками файла
+JOURNAL_PRAGMAS = {
+    'wal': [
+        'PRAGMA journal_mode = WAL',  # Читатели не ждут писателя и наоборот
+        'PRAGMA synchronous = NORMAL',  # В режиме WAL надежно и без fsync на каждый коммит
+        'PRAGMA mmap_size = 268435456',  # 256 МБ файла читаем через отображение в память
+    ],
+    'delete': [
+        'PRAGMA journal_mode = DELETE',
+        'PRAGMA synchronous = FULL',  # С журналом отката NORMAL может испортить базу при сбое питания
+        'PRAGMA mmap_size = 0',  # Отображение файла по сети ненадежно
+    ],
+}
+# Переменная окружения, задающая режим журнала (wal или delete) вместо выбора по месту базы:
+# например, delete для сетевого диска, который is_network_path не распознает
+JOURNAL_MODE_ENV = 'PARTS_JOURNAL_MODE'
+# Типы файловых систем из /proc/mounts, которые считаем сетевыми
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'afs', '9p', 'fuse.sshfs', 'davfs', 'ncpfs'}
+DRIVE_REMOTE = 4  # GetDriveTypeW для сетевого диска Windows
+BACKUP_STEP_PAGES = 4096  # Страниц, которые резервное копирование переносит за шаг; между шагами база доступна
+VACUUM_FREE_FRACTION = 0.1  # maintain отдает свободные страницы, когда их больше этой доли файла
+INCREMENTAL_VACUUM_PAGES = 25600  # Сколько страниц maintain освобождает за раз, чтобы не держать запись долго
+MAINTENANCE_INTERVAL = 30 * 60  # Секунд между плановыми вызовами maintain в программе и на сервере
+
+# Миграции схемы по порядку; номер последней примененной хранится в PRAGMA user_version
+SCHEMA_MIGRATIONS = [
+    '''
+    CREATE TABLE IF NOT EXISTS parts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        part_number TEXT UNIQUE,
+        quantity INTEGER,
+        price REAL,
+        supplier TEXT,
+        description TEXT,
+        date_added TEXT
+    );
+    ''',
+    # Полнотекстовый индекс по названию, артикулу и описанию, синхронизируется триггерами
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS parts_fts USING fts5(
+        name, part_number, description,
+        content='parts', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    );
+    CREATE TRIGGER IF NOT EXISTS parts_fts_insert AFTER INSERT ON parts BEGIN
+        INSERT INTO parts_fts(rowid, name, part_number, description)
+        VALUES (new.id, new.name, new.part_number, new.description);
+    END;
+    CREATE TRIGGER IF NOT EXISTS parts_fts_delete AFTER DELETE ON parts BEGIN
+        INSERT INTO parts_fts(parts_fts, rowid, name, part_number, description)
+        VALUES ('delete', old.id, old.name, old.part_number, old.description);
+    END;
+    CREATE TRIGGER IF NOT EXISTS parts_fts_update AFTER UPDATE ON parts BEGIN
+        INSERT INTO parts_fts(parts_fts, rowid, name, part_number, description)
+        VALUES ('delete', old.id, old.name, old.part_number, old.description);
+        INSERT INTO parts_fts(rowid, name, part_number, description)
+        VALUES (new.id, new.name, new.part_number, new.description);
+    END;
+    INSERT INTO parts_fts(parts_fts) VALUES ('rebuild');
+    ''',
+    # Индексы для сортировки по заголовкам таблицы и для фильтров
+    '''
+    CREATE INDEX IF NOT EXISTS parts_name ON parts(name);
+    CREATE INDEX IF NOT EXISTS parts_supplier ON parts(supplier);
+    CREATE INDEX IF NOT EXISTS parts_quantity ON parts(quantity);
+    CREATE INDEX IF NOT EXISTS parts_price ON parts(price);
+    CREATE INDEX IF NOT EXISTS parts_date_added ON parts(date_added);
+    ''',
+    # Журнал движения остатков; parts.quantity — сумма движений по записи.
+    # Приход, расход и корректировку применяет к parts триггер; начальный остаток
+    # (opening) записывается триггером вставки в parts и уже учтен в quantity.
+    # Индекс (part_id, ts) покрывает quantity, так что остаток на дату считается по индексу
+    '''
+    CREATE TABLE IF NOT EXISTS stock_movements (
+        id INTEGER PRIMARY KEY,
+        part_id INTEGER NOT NULL,
+        kind TEXT NOT NULL CHECK (kind IN ('opening', 'receipt', 'issue', 'adjustment')),
+        quantity INTEGER NOT NULL,
+        ts TEXT NOT NULL,
+        reason TEXT
+    );
+    CREATE INDEX IF NOT EXISTS stock_movements_part_ts ON stock_movements(part_id, ts, quantity);
+    INSERT INTO stock_movements (part_id, kind, quantity, ts, reason)
+    SELECT id, 'opening', quantity, coalesce(date_added, datetime('now', 'localtime')), 'Начальный остаток'
+    FROM parts WHERE coalesce(quantity, 0) <> 0;
+    CREATE TRIGGER IF NOT EXISTS stock_movements_apply AFTER INSERT ON stock_movements
+    WHEN new.kind <> 'opening' BEGIN
+        UPDATE parts SET quantity = coalesce(quantity, 0) + new.quantity WHERE id = new.part_id;
+    END;
+    CREATE TRIGGER IF NOT EXISTS parts_opening_stock AFTER INSERT ON parts
+    WHEN coalesce(new.quantity, 0) <> 0 BEGIN
+        INSERT INTO stock_movements (part_id, kind, quantity, ts, reason)
+        VALUES (new.id, 'opening', new.quantity, coalesce(new.date_added, datetime('now', 'localtime')),
+                'Начальный остаток');
+    END;
+    CREATE TRIGGER IF NOT EXISTS parts_delete_movements AFTER DELETE ON parts BEGIN
+        DELETE FROM stock_movements WHERE part_id = old.id;
+    END;
+    -- Движения меняют только quantity: поисковый индекс при этом перестраивать незачем
+    DROP TRIGGER IF EXISTS parts_fts_update;
+    CREATE TRIGGER parts_fts_update AFTER UPDATE OF name, part_number, description ON parts BEGIN
+        INSERT INTO parts_fts(parts_fts, rowid, name, part_number, description)
+        VALUES ('delete', old.id, old.name, old.part_number, old.description);
+        INSERT INTO parts_fts(rowid, name, part_number, description)
+        VALUES (new.id, new.name, new.part_number, new.description);
+    END;
+    ''',
+    # Сводка для панели: итоги по поставщикам ведут триггеры, список заканчивающихся
+    # запчастей — частичный индекс, так что панель не перебирает всю таблицу.
+    # Стоимость хранится в копейках: целые суммы не накапливают ошибок округления
+    '''
+    ALTER TABLE parts ADD COLUMN min_quantity INTEGER;
+    CREATE INDEX IF NOT EXISTS parts_low_stock ON parts(supplier, name) WHERE quantity < min_quantity;
+    CREATE TABLE IF NOT EXISTS supplier_totals (
+        supplier TEXT PRIMARY KEY,
+        parts INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        value_cents INTEGER NOT NULL
+    );
+    INSERT INTO supplier_totals (supplier, parts, quantity, value_cents)
+    SELECT coalesce(supplier, ''), count(*), sum(coalesce(quantity, 0)),
+           sum(coalesce(quantity, 0) * CAST(round(coalesce(price, 0) * 100) AS INTEGER))
+    FROM parts GROUP BY coalesce(supplier, '');
+    CREATE TRIGGER IF NOT EXISTS supplier_totals_insert AFTER INSERT ON parts BEGIN
+        INSERT INTO supplier_totals (supplier, parts, quantity, value_cents)
+        VALUES (coalesce(new.supplier, ''), 1, coalesce(new.quantity, 0),
+                coalesce(new.quantity, 0) * CAST(round(coalesce(new.price, 0) * 100) AS INTEGER))
+        ON CONFLICT(supplier) DO UPDATE SET
+            parts = parts + 1,
+            quantity = quantity + excluded.quantity,
+            value_cents = value_cents + excluded.value_cents;
+    END;
+    CREATE TRIGGER IF NOT EXISTS supplier_totals_delete AFTER DELETE ON parts BEGIN
+        UPDATE supplier_totals SET
+            parts = parts - 1,
+            quantity = quantity - coalesce(old.quantity, 0),
+            value_cents = value_cents
+                - coalesce(old.quantity, 0) * CAST(round(coalesce(old.price, 0) * 100) AS INTEGER)
+        WHERE supplier = coalesce(old.supplier, '');
+        DELETE FROM supplier_totals WHERE supplier = coalesce(old.supplier, '') AND parts = 0;
+    END;
+    CREATE TRIGGER IF NOT EXISTS supplier_totals_update AFTER UPDATE OF quantity, price, supplier ON parts BEGIN
+        UPDATE supplier_totals SET
+            parts = parts - 1,
+            quantity = quantity - coalesce(old.quantity, 0),
+            value_cents = value_cents
+                - coalesce(old.quantity, 0) * CAST(round(coalesce(old.price, 0) * 100) AS INTEGER)
+        WHERE supplier = coalesce(old.supplier, '');
+        INSERT INTO supplier_totals (supplier, parts, quantity, value_cents)
+        VALUES (coalesce(new.supplier, ''), 1, coalesce(new.quantity, 0),
+                coalesce(new.quantity, 0) * CAST(round(coalesce(new.price, 0) * 100) AS INTEGER))
+        ON CONFLICT(supplier) DO UPDATE SET
+            parts = parts + 1,
+            quantity = quantity + excluded.quantity,
+            value_cents = value_cents + excluded.value_cents;
+        DELETE FROM supplier_totals WHERE supplier = coalesce(old.supplier, '') AND parts = 0;
+    END;
+    ''',
+    # Оптимистическая блокировка: version — значение счетчика change_counter при последнем
+    # изменении записи. Каждая запись в базу сначала увеличивает счетчик, поэтому версии
+    # растут монотонно: по ним и сравнивается запись при сохранении, и находятся записи,
+    # измененные другими пользователями после прошлой проверки
+    '''
+    ALTER TABLE parts ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+    CREATE TABLE IF NOT EXISTS change_counter (value INTEGER NOT NULL);
+    INSERT INTO change_counter (value) VALUES (0);
+    DROP TRIGGER IF EXISTS stock_movements_apply;
+    CREATE TRIGGER stock_movements_apply AFTER INSERT ON stock_movements
+    WHEN new.kind <> 'opening' BEGIN
+        UPDATE parts SET quantity = coalesce(quantity, 0) + new.quantity,
+                         version = (SELECT value FROM change_counter)
+        WHERE id = new.part_id;
+    END;
+    ''',
+]
+
+# Поля записи в том порядке, в котором их заполняет AddEditDialog
+PART_FIELDS = ['name', 'part_number', 'quantity', 'price', 'supplier', 'description']
+# Столбцы записи в запросах (PART_SELECT), они же столбцы таблицы в окне
+PART_COLUMNS = ['id'] + PART_FIELDS + ['date_added']
+# Столбцы, по которым сортируется таблица: у каждого, кроме описания, есть индекс
+SORT_COLUMNS = [column for column in PART_COLUMNS if column != 'description']
+# Столбцы перечислены явно: у parts есть и служебные (min_quantity, version), которые в таблицу не попадают
+PART_SELECT = ', '.join(f'parts.{column}' for column in PART_COLUMNS)
+
+# Строка parts в порядке PART_COLUMNS
+PartRow = Tuple[int, str, Optional[str], int, float, str, str, str]
+# Значения для INSERT: поля PART_FIELDS и date_added
+PartValues = Tuple[str, Optional[str], int, float, str, str, str]
+# Строка stock_movements: id, part_id, вид, изменение остатка, время, причина
+MovementRow = Tuple[int, int, str, int, str, Optional[str]]
+# Ключ keyset-пагинации: id, пара (значение поля сортировки, id) или позиция в выдаче
+PageKey = Union[int, Tuple[object, int]]
+Page = List[Tuple[PageKey, PartRow]]
+
+# Новая версия записи; счетчик увеличивает NEXT_VERSION_SQL в начале каждой транзакции записи
+NEXT_VERSION_SQL = 'UPDATE change_counter SET value = value + 1'
+CURRENT_VERSION = '(SELECT value FROM change_counter)'
+
+INSERT_PART_SQL = f'''
+    INSERT INTO parts (name, part_number, quantity, price, supplier, description, date_added, version)
+    VALUES (?, ?, ?, ?, ?, ?, ?, {CURRENT_VERSION})
+'''
+
+SELECT_PART_SQL = f'SELECT {PART_SELECT} FROM parts WHERE id = ?'
+SELECT_VERSIONED_PART_SQL = f'SELECT {PART_SELECT}, parts.version FROM parts WHERE id = ?'
+
+# Множество id передается одним параметром — JSON-массивом, так что запрос
+# не зависит от числа выбранных строк и остается в кэше подготовленных запросов
+SELECT_PARTS_SQL = f'SELECT {PART_SELECT} FROM parts WHERE id IN (SELECT value FROM json_each(?))'
+DELETE_PARTS_SQL = 'DELETE FROM parts WHERE id IN (SELECT value FROM json_each(?))'
+# Записи из множества, измененные после версии ?, и id из множества, которых в базе больше нет
+CHANGED_PARTS_SQL = SELECT_PARTS_SQL + ' AND version > ?'
+DELETED_PARTS_SQL = 'SELECT value FROM json_each(?) WHERE NOT EXISTS (SELECT 1 FROM parts WHERE id = value)'
+
+# Остаток и дата добавления не перезаписываются: остаток меняют только движения.
+# Запись сохраняется, только если ее версия не изменилась с чтения (NULL — без проверки)
+UPDATE_PART_SQL = f'''
+    UPDATE parts SET
+        name = ?,
+        part_number = ?,
+        price = ?,
+        supplier = ?,
+        description = ?,
+        version = {CURRENT_VERSION}
+    WHERE id = ? AND version = coalesce(?, version)
+'''
+
+# Вставка с обновлением существующей записи по артикулу; остаток существующей
+# записи доводится до нового корректировкой (см. STOCK_LEVEL_ADJUSTMENTS_SQL)
+UPSERT_PART_SQL = INSERT_PART_SQL + '''
+    ON CONFLICT(part_number) DO UPDATE SET
+        name = excluded.name,
+        price = excluded.price,
+        supplier = excluded.supplier,
+        description = excluded.description,
+        version = excluded.version
+'''
+
+# Виды движения остатка
+MOVEMENT_KINDS = {
+    'opening': "Начальный остаток",
+    'receipt': "Приход",
+    'issue': "Расход",
+    'adjustment': "Корректировка",
+}
+
+# Движение остатка записи; ничего не вставляет, если остаток ушел бы в минус
+INSERT_MOVEMENT_SQL = '''
+    INSERT INTO stock_movements (part_id, kind, quantity, ts, reason)
+    SELECT id, ?, ?, ?, ? FROM parts WHERE id = ? AND coalesce(quantity, 0) + ? >= 0
+'''
+
+# Корректировки, доводящие остаток записей до одного значения
+SET_STOCK_SQL = '''
+    INSERT INTO stock_movements (part_id, kind, quantity, ts, reason)
+    SELECT id, 'adjustment', ? - coalesce(quantity, 0), ?, ?
+    FROM parts WHERE id IN (SELECT value FROM json_each(?)) AND quantity IS NOT ?
+'''
+
+# Корректировки до остатков из прайс-листа, собранных во временной таблице stock_levels
+STOCK_LEVELS_TABLE_SQL = '''
+    CREATE TEMP TABLE IF NOT EXISTS stock_levels (part_number TEXT PRIMARY KEY, quantity INTEGER)
+'''
+STOCK_LEVEL_ADJUSTMENTS_SQL = '''
+    INSERT INTO stock_movements (part_id, kind, quantity, ts, reason)
+    SELECT parts.id, 'adjustment', levels.quantity - coalesce(parts.quantity, 0), ?, 'Остаток из прайс-листа'
+    FROM temp.stock_levels AS levels JOIN parts ON parts.part_number = levels.part_number
+    WHERE levels.quantity IS NOT parts.quantity
+'''
+
+STOCK_AT_SQL = 'SELECT coalesce(sum(quantity), 0) FROM stock_movements WHERE part_id = ? AND ts <= ?'
+SELECT_MOVEMENTS_SQL = 'SELECT * FROM stock_movements WHERE part_id = ? ORDER BY ts DESC, id DESC LIMIT ?'
+
+# Фильтры таблицы: имя -> (поле, оператор, выражение с параметром)
+FILTERS = {
+    'supplier': ('supplier', '=', '?'),
+    'quantity_below': ('quantity', '<', '?'),
+    'price_min': ('price', '>=', '?'),
+    'price_max': ('price', '<=', '?'),
+    'date_from': ('date_added', '>=', '?'),
+    'date_to': ('date_added', '<', "date(?, '+1 day')"),
+}
+
+LOW_STOCK_LIMIT = 200  # Сколько заканчивающихся запчастей показывает панель сводки
+
+SUPPLIER_TOTALS_SQL = '''
+    SELECT supplier, parts, quantity, value_cents / 100.0 FROM supplier_totals ORDER BY value_cents DESC
+'''
+# Условие совпадает с условием индекса parts_low_stock, поэтому запросы идут по нему
+LOW_STOCK_SQL = '''
+    SELECT id, name, part_number, quantity, min_quantity, supplier FROM parts
+    WHERE quantity < min_quantity ORDER BY supplier, name LIMIT ?
+'''
+LOW_STOCK_COUNT_SQL = 'SELECT count(*) FROM parts WHERE quantity < min_quantity'
+
+SUPPLIERS_SQL = "SELECT DISTINCT supplier FROM parts WHERE supplier <> '' ORDER BY supplier"
+
+
+def script_statements(script: str) -> Iterator[str]:
+    """Делит скрипт миграции на отдельные запросы (точки с запятой внутри триггеров не делят)"""
+    statement = ''
+    for part in script.split(';'):
+        statement += part + ';'
+        if sqlite3.complete_statement(statement):
+            if statement.strip(' \n;'):
+                yield statement
+            statement = ''
+
+
+def migrate_schema(conn: sqlite3.Connection) -> None:
+    """Доводит схему базы до последней версии, применяя недостающие миграции.
+
+    Базу могут одновременно открыть несколько программ: каждая миграция идет
+    в транзакции BEGIN IMMEDIATE, а номер версии перечитывается уже внутри нее,
+    так что миграцию, примененную другой программой, пока мы ждали, не повторяем.
+    """
+    while conn.execute('PRAGMA user_version').fetchone()[0] < len(SCHEMA_MIGRATIONS):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            if version < len(SCHEMA_MIGRATIONS):
+                for statement in script_statements(SCHEMA_MIGRATIONS[version]):
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {version + 1}')
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def is_network_path(path: str) -> bool:
+    """Лежит ли файл на сетевом диске: UNC-путь, сетевой диск Windows, NFS/SMB в Linux"""
+    if path.startswith(('\\\\', '//')):
+        return True
+    full = os.path.realpath(path)
+    if os.name == 'nt':
+        import ctypes
+        drive = os.path.splitdrive(full)[0]
+        if drive.startswith('\\\\'):
+            return True  # realpath раскрыл сетевой диск в UNC-путь
+        return bool(drive) and ctypes.windll.kernel32.GetDriveTypeW(drive + '\\') == DRIVE_REMOTE
+    try:
+        with open('/proc/mounts', encoding='utf-8') as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return False  # Других способов узнать нет: режим задается через JOURNAL_MODE_ENV
+    fstype, longest = None, -1
+    for point, kind in mounts:
+        point = point.replace('\\040', ' ')
+        if (full == point or full.startswith(point.rstrip('/') + '/')) and len(point) > longest:
+            fstype, longest = kind, len(point)
+    return fstype in NETWORK_FILESYSTEMS
+
+
+def journal_mode(path: str) -> str:
+    """Режим журнала для базы path: из JOURNAL_MODE_ENV, иначе delete на сетевом диске и wal на локальном"""
+    mode = os.environ.get(JOURNAL_MODE_ENV, '').strip().lower()
+    if mode:
+        if mode not in JOURNAL_PRAGMAS:
+            raise ValueError(f"{JOURNAL_MODE_ENV}: неизвестный режим журнала {mode!r} (wal или delete)")
+        return mode
+    return 'delete' if path != ':memory:' and is_network_path(path) else 'wal'
+
+
+def open_connection(path: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    """Открывает соединение с базой, настраивает его и обновляет схему.
+
+    check_same_thread=False — для пула соединений, который сам следит, чтобы
+    соединением одновременно пользовался только один поток.
+    """
+    # ProfiledConnection замеряет запросы, только когда включен parts_profiler.PROFILER
+    pragmas = CONNECTION_PRAGMAS + JOURNAL_PRAGMAS[journal_mode(path)]
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE_SIZE,
+                           check_same_thread=check_same_thread, factory=ProfiledConnection)
+    try:
+        for pragma in pragmas:
+            conn.execute(pragma)
+        migrate_schema(conn)
+    except sqlite3.Error:
+        conn.close()
+        raise
+    return conn
+
+
+def fts_query(search_term: str) -> str:
+    """Превращает введенный текст в запрос FTS5: все слова, каждое как префикс"""
+    words = re.findall(r'\w+', search_term)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_source(search_term: Optional[str]) -> Tuple[str, str, List[str], List[object], str]:
+    """Откуда и с какими условиями читать выдачу поиска.
+
+    Возвращает (FROM, столбец id, условия, их параметры, запрос FTS5 или '').
+    """
+    match = fts_query(search_term) if search_term else ''
+    if match:
+        return ('parts_fts JOIN parts ON parts.id = parts_fts.rowid', 'parts_fts.rowid',
+                ['parts_fts MATCH ?'], [match], match)
+    if search_term:
+        # В тексте нет слов для полнотекстового поиска — ищем подстроку
+        return ('parts', 'parts.id',
+                ['(parts.name LIKE ? OR parts.part_number LIKE ? OR parts.description LIKE ?)'],
+                [f'%{search_term}%'] * 3, '')
+    return 'parts', 'parts.id', [], [], ''
+
+
+def timestamp() -> str:
+    """Текущее время в формате date_added"""
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def id_list(part_ids: Iterable) -> str:
+    """Множество id одним параметром для запросов с json_each"""
+    return json.dumps([int(i) for i in part_ids])
+
+
+def page_key(value: Union[int, list, None]) -> Optional[PageKey]:
+    """Ключ страницы, прочитанный из JSON: пары приходят списками"""
+    return tuple(value) if isinstance(value, list) else value
+
+
+def check_sort(sort: str) -> None:
+    """Поле сортировки подставляется в текст запроса, поэтому принимаем только SORT_COLUMNS"""
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"нельзя сортировать по полю: {sort}")
+
+
+@contextmanager
+def replacing_file(path: str) -> Iterator[str]:
+    """with replacing_file(path) as partial_path: — запись файла под временным именем.
+
+    Блок пишет в partial_path; после успешного выхода файл переименовывается в
+    path, а при ошибке или отмене удаляется вместе со служебными файлами SQLite,
+    так что прежний path не портится недописанной копией.
+    """
+    partial_path = path + '.part'
+    try:
+        yield partial_path
+        os.replace(partial_path, path)
+    except BaseException:
+        for name in (partial_path, partial_path + '-journal', partial_path + '-wal', partial_path + '-shm'):
+            if os.path.exists(name):
+                os.remove(name)
+        raise
+
+
+class ConflictError(ValueError):
+    """Запись изменил другой пользователь после того, как ее прочитали для редактирования"""
+
+    def __init__(self, current: Optional[PartRow], version: Optional[int]):
+        super().__init__("запчасть изменена другим пользователем" if current else "запчасть удалена")
+        self.current = current  # Запись в базе сейчас (None, если ее удалили)
+        self.version = version
+
+
+def retry_locked(method):
+    """Повторяет транзакцию записи, если база занята другим пользователем дольше BUSY_TIMEOUT"""
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        delay = LOCK_RETRY_DELAY
+        for attempt in range(LOCK_RETRIES + 1):
+            try:
+                return method(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                busy = 'locked' in str(e) or 'busy' in str(e)
+                if not busy or attempt == LOCK_RETRIES:
+                    raise
+            time.sleep(delay)
+            delay *= 2
+    return wrapper
+
+
+class PartsRepository:
+    """Запчасти в одной базе SQLite.
+
+    Все методы, кроме interrupt, вызываются из потока, который открыл хранилище:
+    соединение sqlite3 нельзя передавать между потоками.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        # Последние страницы поиска (LRU): аргументы read_page -> (пары (ключ, id), ранжирование).
+        # Храним только id, строки перечитываем по первичному ключу
+        self.search_cache = OrderedDict()
+        # PRAGMA data_version меняется, когда базу изменило другое соединение: для кэша поиска
+        # и для changes запоминаем значения отдельно, чтобы одна проверка не скрыла другую
+        self.cache_data_version = self.changes_data_version = None
+
+    @classmethod
+    def open(cls, path: str, check_same_thread: bool = True) -> 'PartsRepository':
+        """Открывает базу path, создавая ее и доводя схему до последней версии"""
+        return cls(open_connection(path, check_same_thread))
+
+    def close(self) -> None:
+        try:
+            # Дешевое обновление статистики планировщика по запросам этого сеанса
+            self.conn.execute('PRAGMA optimize')
+        except sqlite3.Error:
+            pass
+        self.conn.close()
+
+    def interrupt(self) -> None:
+        """Прерывает выполняющийся запрос; можно вызывать из любого потока"""
+        self.conn.interrupt()
+
+    def invalidate(self) -> None:
+        """Забывает запомненные результаты поиска; вызывается после любого изменения данных"""
+        self.search_cache.clear()
+
+    def next_version(self) -> None:
+        """Начинает транзакцию записи: следующая версия для изменяемых записей"""
+        self.conn.execute(NEXT_VERSION_SQL)
+
+    def data_version(self) -> int:
+        return self.conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def generation(self) -> int:
+        """Номер последней транзакции записи; меняется при любом изменении данных"""
+        return self.conn.execute('SELECT value FROM change_counter').fetchone()[0]
+
+    def count(self) -> int:
+        return self.conn.execute('SELECT count(*) FROM parts').fetchone()[0]
+
+    def get(self, part_id: int) -> Optional[PartRow]:
+        return self.conn.execute(SELECT_PART_SQL, (part_id,)).fetchone()
+
+    def get_many(self, part_ids: Iterable[int]) -> List[PartRow]:
+        return self.conn.execute(SELECT_PARTS_SQL, (id_list(part_ids),)).fetchall()
+
+    def get_versioned(self, part_id: int) -> Optional[Tuple[PartRow, int]]:
+        """Запись для редактирования и ее версия, которую нужно передать в update"""
+        row = self.conn.execute(SELECT_VERSIONED_PART_SQL, (part_id,)).fetchone()
+        return (row[:-1], row[-1]) if row else None
+
+    @retry_locked
+    def add(self, values: PartValues) -> PartRow:
+        """Добавляет запись и возвращает ее вместе с присвоенным id"""
+        with self.conn:
+            self.next_version()
+            part_id = self.conn.execute(INSERT_PART_SQL, values).lastrowid
+        self.invalidate()
+        return self.get(part_id)
+
+    @retry_locked
+    def update(self, part_id: int, values: PartValues, shown_quantity: Optional[int] = None,
+               version: Optional[int] = None) -> Optional[PartRow]:
+        """Сохраняет поля записи из окна редактирования и возвращает ее.
+
+        Если передана version (из get_versioned), запись сохраняется, только пока
+        ее никто не изменил; иначе — ConflictError с текущей записью. Остаток
+        не перезаписывается: если в окне его изменили с shown_quantity, разница
+        записывается корректировкой.
+        """
+        name, part_number, quantity, price, supplier, description, _ = values
+        with self.conn:
+            self.next_version()
+            updated = self.conn.execute(
+                UPDATE_PART_SQL, (name, part_number, price, supplier, description, part_id, version)
+            ).rowcount
+            if not updated:
+                current = self.get_versioned(part_id)
+                raise ConflictError(*(current or (None, None)))
+            if shown_quantity is not None and quantity != shown_quantity:
+                self.write_movement(part_id, 'adjustment', quantity - shown_quantity, "Изменение в карточке")
+        self.invalidate()
+        return self.get(part_id)
+
+    @retry_locked
+    def delete(self, part_ids: Iterable[int]) -> None:
+        """Удаляет записи с указанными id одним запросом"""
+        with self.conn:
+            self.next_version()
+            self.conn.execute(DELETE_PARTS_SQL, (id_list(part_ids),))
+        self.invalidate()
+
+    @retry_locked
+    def update_fields(self, part_ids: Iterable[int], changes: Dict[str, object]) -> List[PartRow]:
+        """Одним UPDATE присваивает полям changes ({поле: значение}) записей part_ids новые
+        значения; новый остаток записывается корректировками. Возвращает обновленные строки"""
+        fields = [field for field in PART_FIELDS if field in changes and field != 'quantity']
+        assignments = ', '.join([f'{field} = ?' for field in fields] + [f'version = {CURRENT_VERSION}'])
+        ids = id_list(part_ids)
+        with self.conn:
+            self.next_version()
+            if fields:
+                self.conn.execute(
+                    f'UPDATE parts SET {assignments} WHERE id IN (SELECT value FROM json_each(?))',
+                    [changes[field] for field in fields] + [ids]
+                )
+            if 'quantity' in changes:
+                quantity = changes['quantity']
+                self.conn.execute(SET_STOCK_SQL, (quantity, timestamp(), "Групповое изменение", ids, quantity))
+        self.invalidate()
+        return self.conn.execute(SELECT_PARTS_SQL, (ids,)).fetchall()
+
+    @retry_locked
+    def insert_many(self, rows: Sequence[PartValues], update_existing: bool = True) -> Tuple[int, int]:
+        """Вставляет записи одной транзакцией. Записи с существующим артикулом
+        обновляет (update_existing) или пропускает. Возвращает (добавлено, обновлено/пропущено)"""
+        count_before = self.count()
+        with self.conn:
+            self.write_batch(rows, update_existing)
+        self.invalidate()
+        inserted = self.count() - count_before
+        return inserted, len(rows) - inserted
+
+    def upsert_stream(self, records: Iterable[Tuple[PartValues, Optional[float]]],
+                      progress: Callable[[str, Optional[float]], None]) -> Tuple[int, int]:
+        """Потоково вставляет записи, обновляя существующие по артикулу.
+
+        records — пары (значения, доля прочитанного источника). Записи пишутся
+        пачками по IMPORT_BATCH_SIZE через executemany и фиксируются каждые
+        IMPORT_COMMIT_ROWS строк; при ошибке откатывается только незафиксированное.
+        Возвращает (добавлено, обновлено).
+        """
+        count_before = self.count()
+        batch, accepted = [], 0
+        try:
+            for values, fraction in records:
+                batch.append(values)
+                if len(batch) == IMPORT_BATCH_SIZE:
+                    self.write_batch(batch)
+                    accepted += len(batch)
+                    batch = []
+                    if accepted % IMPORT_COMMIT_ROWS == 0:
+                        self.conn.commit()
+                    progress(f"загружено строк: {accepted}", fraction)
+
+            if batch:
+                self.write_batch(batch)
+                accepted += len(batch)
+            self.conn.commit()
+        except BaseException:
+            self.conn.rollback()
+            raise
+        finally:
+            self.invalidate()  # Часть пачек могла успеть зафиксироваться
+
+        inserted = self.count() - count_before
+        return inserted, accepted - inserted
+
+    def write_batch(self, rows: Sequence[PartValues], update_existing: bool = True) -> None:
+        """Вставляет пачку записей без фиксации транзакции.
+
+        Если update_existing, записи с существующим артикулом обновляются, а их
+        остаток доводится до нового корректировками (одним запросом на пачку).
+        """
+        self.next_version()
+        if not update_existing:
+            self.conn.executemany(INSERT_PART_SQL + ' ON CONFLICT(part_number) DO NOTHING', rows)
+            return
+        self.conn.executemany(UPSERT_PART_SQL, rows)
+        self.conn.execute(STOCK_LEVELS_TABLE_SQL)
+        self.conn.execute('DELETE FROM temp.stock_levels')
+        # Для повторяющегося в пачке артикула остается последний остаток
+        self.conn.executemany('INSERT OR REPLACE INTO temp.stock_levels VALUES (?, ?)',
+                              ((row[1], row[2]) for row in rows if row[1] is not None))
+        self.conn.execute(STOCK_LEVEL_ADJUSTMENTS_SQL, (timestamp(),))
+
+    @retry_locked
+    def record_movement(self, part_id: int, kind: str, quantity: int, reason: str = '') -> PartRow:
+        """Записывает приход (receipt), расход (issue) или корректировку (adjustment).
+
+        quantity — сколько пришло или ушло (для корректировки — изменение со знаком).
+        Расход больше остатка не записывается: ValueError. Возвращает запись
+        с новым остатком.
+        """
+        if kind not in ('receipt', 'issue', 'adjustment'):
+            raise ValueError(f"неизвестный вид движения: {kind}")
+        if kind != 'adjustment' and quantity <= 0:
+            raise ValueError("количество должно быть больше нуля")
+        with self.conn:
+            self.next_version()
+            self.write_movement(part_id, kind, -quantity if kind == 'issue' else quantity, reason)
+        self.invalidate()
+        return self.get(part_id)
+
+    def write_movement(self, part_id: int, kind: str, change: int, reason: str) -> None:
+        """Вставляет движение без фиксации транзакции (после next_version); остаток в минус не уводит"""
+        inserted = self.conn.execute(
+            INSERT_MOVEMENT_SQL, (kind, change, timestamp(), reason or None, part_id, change)
+        ).rowcount
+        if not inserted:
+            raise ValueError("недостаточно на складе" if self.get(part_id) else "запчасть не найдена")
+
+    def movements(self, part_id: int, limit: int = 1000) -> List[MovementRow]:
+        """Последние движения остатка записи, новые первыми"""
+        return self.conn.execute(SELECT_MOVEMENTS_SQL, (part_id, limit)).fetchall()
+
+    def stock_at(self, part_id: int, ts: str) -> int:
+        """Остаток записи на момент ts (в формате date_added) по журналу движений"""
+        return self.conn.execute(STOCK_AT_SQL, (part_id, ts)).fetchone()[0]
+
+    def count_rows(self, search_term: Optional[str] = None,
+                   filters: Optional[Dict[str, object]] = None, limit: Optional[int] = None) -> int:
+        """Сколько записей в выборке; с limit считает не дальше limit строк"""
+        source, _, conditions, params = self.selection(search_term, filters)
+        query = f'SELECT 1 FROM {source}'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        return self.conn.execute(f'SELECT count(*) FROM ({query})', params).fetchone()[0]
+
+    def iter_rows(self, search_term: Optional[str] = None, sort: str = 'id', descending: bool = False,
+                  filters: Optional[Dict[str, object]] = None,
+                  chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[PartRow]]:
+        """Все записи выборки в порядке таблицы, пачками по chunk_size строк.
+
+        Строки читаются курсором через fetchmany по мере того, как их забирают,
+        так что в памяти одновременно находится не больше одной пачки.
+        """
+        check_sort(sort)
+        source, id_column, conditions, params = self.selection(search_term, filters)
+        order = 'DESC' if descending else 'ASC'
+        if (fts_query(search_term or '') and sort == 'id' and not descending
+                and self.count_rows(search_term, filters, RANKED_SEARCH_LIMIT + 1) <= RANKED_SEARCH_LIMIT):
+            order_by = 'parts_fts.rank'  # Как в таблице: небольшая выдача по релевантности
+        elif sort == 'id':
+            order_by = f'{id_column} {order}'
+        else:
+            order_by = f'parts.{sort} {order}, {id_column} {order}'
+        query = f'SELECT {PART_SELECT} FROM {source}'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        cursor = self.conn.execute(f'{query} ORDER BY {order_by}', params)
+        try:
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cursor.close()
+
+    def selection(self, search_term: Optional[str],
+                  filters: Optional[Dict[str, object]]) -> Tuple[str, str, List[str], List[object]]:
+        """FROM, столбец id, условия и параметры выборки с поиском и фильтрами"""
+        source, id_column, conditions, params, _ = search_source(search_term)
+        for name, value in (filters or {}).items():
+            column, op, placeholder = FILTERS[name]
+            conditions.append(f'parts.{column} {op} {placeholder}')
+            params.append(value)
+        return source, id_column, conditions, params
+
+    @retry_locked
+    def set_min_quantity(self, part_ids: Iterable[int], min_quantity: Optional[int]) -> None:
+        """Задает порог остатка, ниже которого запчасть попадает в список заканчивающихся"""
+        with self.conn:
+            self.next_version()
+            self.conn.execute('UPDATE parts SET min_quantity = ? WHERE id IN (SELECT value FROM json_each(?))',
+                              (min_quantity, id_list(part_ids)))
+
+    def dashboard(self, low_stock_limit: int = LOW_STOCK_LIMIT) -> Dict[str, object]:
+        """Сводка для панели: стоимость склада, итоги по поставщикам, заканчивающиеся запчасти.
+
+        Итоги читаются из supplier_totals, которую обновляют триггеры, а список
+        заканчивающихся — из частичного индекса, так что время не зависит от размера parts.
+        """
+        suppliers = self.conn.execute(SUPPLIER_TOTALS_SQL).fetchall()
+        return {
+            'value': sum(row[3] for row in suppliers),
+            'parts': sum(row[1] for row in suppliers),
+            'quantity': sum(row[2] for row in suppliers),
+            'suppliers': suppliers,
+            'low_stock': self.conn.execute(LOW_STOCK_SQL, (low_stock_limit,)).fetchall(),
+            'low_stock_count': self.conn.execute(LOW_STOCK_COUNT_SQL).fetchone()[0],
+        }
+
+    def suppliers(self) -> List[str]:
+        """Поставщики, встречающиеся в базе, по алфавиту"""
+        return [row[0] for row in self.conn.execute(SUPPLIERS_SQL)]
+
+    def changes(self, since: int, part_ids: Iterable[int]) -> Optional[Tuple[int, List[PartRow], List[int]]]:
+        """Изменения записей part_ids, сделанные другими пользователями.
+
+        Если с прошлого вызова базу не меняло ни одно другое соединение, возвращает None,
+        потратив на проверку один PRAGMA data_version. Иначе — то же, что changed_since.
+        """
+        data_version = self.data_version()
+        if data_version == self.changes_data_version:
+            return None
+        self.changes_data_version = data_version
+        return self.changed_since(since, part_ids)
+
+    def changed_since(self, since: int, part_ids: Iterable[int]) -> Tuple[int, List[PartRow], List[int]]:
+        """Текущий номер generation (его передают как since в следующий раз), записи
+        из part_ids с версией больше since и id записей, которых больше нет"""
+        # Счетчик читаем до записей: изменение, зафиксированное между запросами,
+        # в худшем случае вернется еще раз, но не потеряется
+        counter = self.generation()
+        ids = id_list(part_ids)
+        changed = self.conn.execute(CHANGED_PARTS_SQL, (ids, since)).fetchall()
+        deleted = [row[0] for row in self.conn.execute(DELETED_PARTS_SQL, (ids,))]
+        return counter, changed, deleted
+
+    def storage_info(self) -> Dict[str, int]:
+        """Размер файла базы: страниц всего и свободных, режим auto_vacuum (2 — инкрементальный)"""
+        page_size, pages, free_pages, auto_vacuum = (
+            self.conn.execute(f'PRAGMA {name}').fetchone()[0]
+            for name in ('page_size', 'page_count', 'freelist_count', 'auto_vacuum')
+        )
+        return {'page_size': page_size, 'pages': pages, 'free_pages': free_pages,
+                'auto_vacuum': auto_vacuum, 'bytes': page_size * pages}
+
+    def backup(self, path: str,
+               progress: Optional[Callable[[str, Optional[float]], None]] = None) -> Dict[str, float]:
+        """Копирует базу в файл path через online backup API SQLite, не останавливая работу.
+
+        Страницы переносятся шагами по BACKUP_STEP_PAGES; если между шагами базу
+        изменит другое соединение, SQLite начнет копирование заново, поэтому копия
+        всегда соответствует одному моменту.
+        """
+        if os.path.exists(path) and any(file and os.path.samefile(path, file)
+                                        for _, _, file in self.conn.execute('PRAGMA database_list')):
+            raise ValueError("Нельзя записать копию поверх открытой базы")
+
+        def report(status, remaining, total):
+            if progress:
+                progress(f"скопировано страниц: {total - remaining} из {total}",
+                         (total - remaining) / total if total else None)
+
+        started = time.perf_counter()
+        with replacing_file(path) as partial_path:
+            target = sqlite3.connect(partial_path)
+            try:
+                self.conn.backup(target, pages=BACKUP_STEP_PAGES, progress=report)
+                pages = target.execute('PRAGMA page_count').fetchone()[0]
+            finally:
+                target.close()
+        return {'seconds': time.perf_counter() - started, 'bytes': os.path.getsize(path), 'pages': pages}
+
+    @retry_locked
+    def optimize(self, full: bool = False) -> float:
+        """Обновляет статистику планировщика и возвращает время в секундах.
+
+        full=True — ANALYZE всех таблиц и индексов; иначе PRAGMA optimize,
+        который анализирует только то, что устарело.
+        """
+        started = time.perf_counter()
+        self.conn.execute('ANALYZE' if full else 'PRAGMA optimize')
+        return time.perf_counter() - started
+
+    @retry_locked
+    def vacuum(self) -> Dict[str, float]:
+        """Перестраивает файл базы (VACUUM), возвращая системе место удаленных строк.
+
+        Заодно включает auto_vacuum = INCREMENTAL: дальше свободные страницы
+        отдает плановый maintain, и полный VACUUM больше не нужен.
+        """
+        started = time.perf_counter()
+        size_before = self.storage_info()['bytes']
+        self.conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        self.conn.execute('VACUUM')
+        # VACUUM в режиме WAL переписывает через журнал всю базу: сразу переносим ее в файл
+        self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return {'seconds': time.perf_counter() - started, 'bytes_before': size_before,
+                'bytes': self.storage_info()['bytes']}
+
+    @retry_locked
+    def maintain(self) -> Dict[str, float]:
+        """Плановое обслуживание: PRAGMA optimize и, если свободных страниц
+        больше VACUUM_FREE_FRACTION файла, incremental_vacuum"""
+        started = time.perf_counter()
+        self.conn.execute('PRAGMA optimize')
+        info = self.storage_info()
+        freed = 0
+        if info['auto_vacuum'] == 2 and info['free_pages'] > info['pages'] * VACUUM_FREE_FRACTION:
+            freed = min(info['free_pages'], INCREMENTAL_VACUUM_PAGES)
+            # Прагма освобождает по странице за шаг, а execute делает только первый шаг
+            # запроса без столбцов; executescript выполняет ее до конца
+            self.conn.executescript(f'PRAGMA incremental_vacuum({freed});')
+            self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return {'seconds': time.perf_counter() - started, 'freed_pages': freed,
+                'free_pages': info['free_pages'] - freed}
+
+    def read_page(self, search_term: str, ranked: bool, after: Optional[PageKey] = None,
+                  before: Optional[PageKey] = None, sort: str = 'id', descending: bool = False,
+                  filters: Optional[Dict[str, object]] = None, page_size: int = PAGE_SIZE) -> Tuple[Page, bool]:
+        """Читает страницу записей (см. query_page); страницы поиска берет из кэша.
+
+        При наборе текста одни и те же запросы повторяются (стертая буква, возврат
+        к прежнему слову), и для них вместо поиска по индексу достаточно прочитать
+        строки по запомненным id.
+        """
+        if not search_term:
+            return self.query_page(search_term, ranked, after, before, sort, descending, filters, page_size)
+
+        data_version = self.data_version()
+        if data_version != self.cache_data_version:
+            self.invalidate()  # Записи добавил или изменил другой пользователь
+            self.cache_data_version = data_version
+        cache_key = (search_term, ranked, after, before, sort, descending,
+                     tuple(sorted((filters or {}).items())), page_size)
+        cached = self.search_cache.get(cache_key)
+        if cached is not None:
+            self.search_cache.move_to_end(cache_key)
+            keys, ranked = cached
+            rows = {row[0]: row for row in self.get_many(part_id for _, part_id in keys)}
+            return [(key, rows[part_id]) for key, part_id in keys], ranked
+
+        page, ranked = self.query_page(search_term, ranked, after, before, sort, descending, filters,
+                                       page_size)
+        self.search_cache[cache_key] = ([(key, row[0]) for key, row in page], ranked)
+        if len(self.search_cache) > SEARCH_CACHE_SIZE:
+            self.search_cache.popitem(last=False)
+        return page, ranked
+
+    def query_page(self, search_term: str, ranked: bool, after: Optional[PageKey] = None,
+                   before: Optional[PageKey] = None, sort: str = 'id', descending: bool = False,
+                   filters: Optional[Dict[str, object]] = None, page_size: int = PAGE_SIZE) -> Tuple[Page, bool]:
+        """Читает страницу из page_size записей. Возвращает пары (ключ, строка) и признак ранжирования.
+
+        Записи упорядочены по полю sort (при равенстве — по id) и отобраны фильтрами
+        filters ({имя из FILTERS: значение}). Ключ записи — id или пара
+        (значение sort, id) для keyset-пагинации; для поиска с ранжированием ключ —
+        позиция записи в выдаче, отсортированной по релевантности. Решение
+        о ранжировании принимается на первой странице выдачи и должно передаваться
+        в запросы следующих страниц.
+        """
+        check_sort(sort)
+        source, id_column, conditions, params, match = search_source(search_term)
+        column_filters = [(*FILTERS[name], value) for name, value in (filters or {}).items()]
+
+        def where(skip_ops=(), by_sort_index=False):
+            """Условия выборки; фильтры поля сортировки с операторами skip_ops опускаются.
+
+            by_sort_index: унарный + не дает планировщику взять для фильтров их индексы,
+            и строки читаются по индексу поля сортировки.
+            """
+            prefix = '+' if by_sort_index else ''
+            parts = conditions + [f'{prefix}parts.{column} {op} {placeholder}'
+                                  for column, op, placeholder, _ in column_filters
+                                  if not (column == sort and op in skip_ops)]
+            values = params + [value for column, op, _, value in column_filters
+                               if not (column == sort and op in skip_ops)]
+            return parts, values
+
+        cursor = self.conn.cursor()
+        try:
+            wide_filters = False
+            if column_filters and not match:
+                parts, values = where()
+                cursor.execute(
+                    f'SELECT count(*) FROM (SELECT 1 FROM {source} WHERE {" AND ".join(parts)} LIMIT ?)',
+                    values + [WIDE_FILTER_LIMIT + 1]
+                )
+                wide_filters = cursor.fetchone()[0] > WIDE_FILTER_LIMIT
+
+            if match and sort == 'id' and not descending and after is None and before is None:
+                # Первая страница: решаем, по силам ли ранжировать всю выдачу
+                parts, values = where()
+                cursor.execute(
+                    f'SELECT count(*) FROM (SELECT 1 FROM {source} WHERE {" AND ".join(parts)} LIMIT ?)',
+                    values + [RANKED_SEARCH_LIMIT + 1]
+                )
+                ranked = cursor.fetchone()[0] <= RANKED_SEARCH_LIMIT
+
+            if match and ranked:
+                if before is not None:
+                    offset = max(before - page_size, 0)
+                    limit = before - offset
+                else:
+                    offset = 0 if after is None else after + 1
+                    limit = page_size
+                parts, values = where()
+                cursor.execute(
+                    f'SELECT {PART_SELECT} FROM {source} WHERE {" AND ".join(parts)} '
+                    f'ORDER BY parts_fts.rank LIMIT ? OFFSET ?',
+                    values + [limit, offset]
+                )
+                return list(enumerate(cursor.fetchall(), start=offset)), True
+
+            # Страницу "назад" читаем в обратном порядке, чтобы взять ближайшие записи
+            backward = before is not None
+            reverse = descending != backward
+            key = before if backward else after
+            order = 'DESC' if reverse else 'ASC'
+            op = '<' if reverse else '>'
+            # Фильтры, которые уже следуют из условия на ключ: они бы перебили его
+            # как границу диапазона по индексу, и каждая страница читалась бы с начала
+            implied_ops = ('<', '<=') if reverse else ('>', '>=')
+
+            # Части выдачи в порядке чтения: (условия, параметры, ORDER BY, опустить фильтры)
+            if sort == 'id':
+                segments = [([f'{id_column} {op} ?'] if key is not None else [],
+                              [key] if key is not None else [], f'{id_column} {order}', ())]
+            else:
+                # NULL в SQLite меньше любых значений: по возрастанию пустые поля идут
+                # первыми, по убыванию — последними. Каждую часть читаем отдельным
+                # запросом, чтобы оба шли по индексу поля диапазоном
+                column = f'parts.{sort}'
+                order_by = f'{column} {order}, {id_column} {order}'
+                null_part = ([f'{column} IS NULL'], [], order_by, ())
+                value_part = ([f'{column} IS NOT NULL'], [], order_by, ())
+                start = 0
+                if key is not None:
+                    value, part_id = key
+                    if value is None:
+                        null_part = ([f'{column} IS NULL', f'{id_column} {op} ?'], [part_id], order_by, ())
+                        start = 1 if reverse else 0
+                    else:
+                        value_part = ([f'({column}, {id_column}) {op} (?, ?)'], [value, part_id],
+                                      order_by, implied_ops)
+                        start = 0 if reverse else 1
+                segments = ([value_part, null_part] if reverse else [null_part, value_part])[start:]
+
+            rows = []
+            for extra, extra_params, order_by, skip_ops in segments:
+                parts, values = where(skip_ops, wide_filters)
+                query = f'SELECT {PART_SELECT} FROM {source}'
+                if parts + extra:
+                    query += ' WHERE ' + ' AND '.join(parts + extra)
+                query += f' ORDER BY {order_by} LIMIT ?'
+                cursor.execute(query, values + extra_params + [page_size - len(rows)])
+                rows += cursor.fetchall()
+                if len(rows) == page_size:
+                    break
+        finally:
+            cursor.close()
+
+        if backward:
+            rows.reverse()
+        if sort == 'id':
+            return [(row[0], row) for row in rows], False
+        index = PART_COLUMNS.index(sort)
+        return [((row[index], row[0]), row) for row in rows], False
@@ -0,0 +1,344 @@
+"""HTTP/JSON-сервер над базой запчастей для работы нескольких пользователей.
+
+Сервер однопоточный на asyncio; запросы к базе выполняются в пуле потоков,
+каждый со своим соединением из RepositoryPool. Ответы со списками отдаются
+страницами (keyset-пагинация, как в таблице программы) и помечаются ETag:
+пока база не менялась, повторный запрос с If-None-Match получает 304 без
+обращения к данным. Окно программы подключается к серверу через
+RemoteRepository (parts_client.py) вместо файла базы.
+
+Запуск: python parts_server.py parts.db --port 8765
+        python Programm.py --serve parts.db --port 8765
+С --profile сервер замеряет запросы (parts_profiler.py); p50/p95 — GET /stats.
+"""
+import argparse
+import asyncio
+import json
+import queue
+import re
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+from parts_client import DEFAULT_PORT
+from parts_profiler import PROFILER
+from parts_repository import (EXPORT_CHUNK_SIZE, MAINTENANCE_INTERVAL, PAGE_SIZE, ConflictError, PartsRepository,
+                              page_key)
+
+DEFAULT_HOST = '127.0.0.1'  # Только этот компьютер; для сети запускайте с --host 0.0.0.0
+POOL_SIZE = 4  # Соединений с базой и потоков, выполняющих запросы к ней
+MAX_BODY_SIZE = 64 * 1024 * 1024  # Тело запроса больше этого не принимаем: импорт идет пачками
+MAX_PAGE_SIZE = EXPORT_CHUNK_SIZE  # Сколько строк можно запросить одной страницей
+
+
+class HTTPError(Exception):
+    """Ответ с ошибкой: статус и JSON {"error": текст, ...}"""
+
+    def __init__(self, status, message, **details):
+        super().__init__(message)
+        self.status = status
+        self.body = {'error': message, **details}
+
+
+class RepositoryPool:
+    """Пул соединений: каждым хранилищем одновременно пользуется только один поток"""
+
+    def __init__(self, path, size=POOL_SIZE):
+        self.size = size
+        self.repositories = queue.Queue()
+        for _ in range(size):
+            self.repositories.put(PartsRepository.open(path, check_same_thread=False))
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix='database')
+
+    def call(self, name, *args):
+        repository = self.repositories.get()
+        try:
+            return getattr(repository, name)(*args)
+        finally:
+            self.repositories.put(repository)
+
+    async def run(self, name, *args):
+        """Выполняет метод хранилища name в потоке пула"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, self.call, name, *args)
+
+    def close(self):
+        self.executor.shutdown()
+        for _ in range(self.size):
+            self.repositories.get().close()
+
+
+class Request:
+    def __init__(self, method, target, headers, body):
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path
+        self.query = dict(parse_qsl(url.query, keep_blank_values=True))
+        self.headers = headers
+        self.body = json.loads(body) if body else {}
+        self.params = ()  # Группы из шаблона пути
+
+    def json_arg(self, name, default=None):
+        """Параметр строки запроса, переданный как JSON (ключи страниц, фильтры)"""
+        value = self.query.get(name)
+        return default if value in (None, '') else json.loads(value)
+
+    def int_arg(self, name, default):
+        value = self.query.get(name)
+        return default if value in (None, '') else int(value)
+
+    def limit_arg(self, default):
+        """Параметр limit в пределах 1..MAX_PAGE_SIZE: LIMIT -1 в SQLite отдал бы всю таблицу"""
+        limit = self.int_arg('limit', default)
+        return None if limit is None else max(1, min(limit, MAX_PAGE_SIZE))
+
+
+class PartsServer:
+    """Маршруты API и их обработчики; все обращения к базе идут через пул"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        # (метод, шаблон пути, обработчик); более частные пути раньше /parts/<id>
+        self.routes = [
+            ('GET', r'/generation', self.get_generation),
+            ('GET', r'/parts', self.list_parts),
+            ('POST', r'/parts', self.add_part),
+            ('PATCH', r'/parts', self.update_fields),
+            ('DELETE', r'/parts', self.delete_parts),
+            ('GET', r'/parts/count', self.count_parts),
+            ('POST', r'/parts/bulk', self.insert_parts),
+            ('POST', r'/parts/changes', self.changed_parts),
+            ('POST', r'/parts/min-quantity', self.set_min_quantity),
+            ('GET', r'/parts/(\d+)', self.get_part),
+            ('PUT', r'/parts/(\d+)', self.update_part),
+            ('DELETE', r'/parts/(\d+)', self.delete_part),
+            ('GET', r'/parts/(\d+)/movements', self.list_movements),
+            ('POST', r'/parts/(\d+)/movements', self.record_movement),
+            ('GET', r'/parts/(\d+)/stock', self.stock_at),
+            ('GET', r'/suppliers', self.list_suppliers),
+            ('GET', r'/dashboard', self.get_dashboard),
+            ('GET', r'/stats', self.get_stats),
+        ]
+        self.routes = [(method, re.compile(pattern + '$'), handler) for method, pattern, handler in self.routes]
+
+    async def handle(self, reader, writer):
+        """Обслуживает одно соединение; HTTP/1.1 keep-alive — запрос за запросом"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_SIZE:
+                    await self.respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                       {'error': "слишком большой запрос"}, close=True)
+                    break
+                body = await reader.readexactly(length)
+                status, payload, extra_headers = await self.dispatch(method, target, headers, body)
+                close = headers.get('connection', '').lower() == 'close' or version == 'HTTP/1.0'
+                await self.respond(writer, status, payload, extra_headers, close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # Клиент закрыл соединение или прислал не HTTP
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, headers=(), close=False):
+        data = b'' if payload is None else json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        lines = [f'HTTP/1.1 {status.value} {status.phrase}',
+                 f'Content-Length: {len(data)}',
+                 f'Connection: {"close" if close else "keep-alive"}']
+        if data:
+            lines.append('Content-Type: application/json; charset=utf-8')
+        lines += [f'{name}: {value}' for name, value in headers]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + data)
+        await writer.drain()
+
+    async def dispatch(self, method, target, headers, body):
+        """Находит обработчик и превращает исключения в ответы с ошибкой"""
+        try:
+            request = Request(method, target, headers, body)
+            for route_method, pattern, handler in self.routes:
+                match = pattern.match(request.path)
+                if match and route_method == method:
+                    request.params = tuple(int(group) for group in match.groups())
+                    with PROFILER.measure(f'HTTP: {method} {pattern.pattern[:-1]}'):
+                        result = await handler(request)
+                    return result if isinstance(result, tuple) else (HTTPStatus.OK, result, ())
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"нет такого адреса: {method} {request.path}")
+        except HTTPError as e:
+            return e.status, e.body, ()
+        except ConflictError as e:
+            return HTTPStatus.PRECONDITION_FAILED, {'error': str(e), 'part': e.current, 'version': e.version}, ()
+        except sqlite3.IntegrityError as e:
+            return HTTPStatus.CONFLICT, {'error': str(e), 'integrity': True}, ()
+        except (ValueError, KeyError, TypeError) as e:
+            return HTTPStatus.BAD_REQUEST, {'error': str(e)}, ()
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}, ()
+
+    async def cached(self, request, name, *args):
+        """Ответ на чтение с ETag по номеру generation: пока база не менялась, 304 без запроса"""
+        etag = f'"g{await self.pool.run("generation")}"'
+        if request.headers.get('if-none-match') == etag:
+            return HTTPStatus.NOT_MODIFIED, None, [('ETag', etag)]
+        return HTTPStatus.OK, await self.pool.run(name, *args), [('ETag', etag)]
+
+    async def get_generation(self, request):
+        return {'generation': await self.pool.run('generation')}
+
+    async def list_parts(self, request):
+        """Страница записей: search, sort, desc, filters (JSON), after/before (ключ в JSON), limit"""
+        limit = request.limit_arg(PAGE_SIZE)
+        status, result, headers = await self.cached(
+            request, 'read_page', request.query.get('search') or None, request.query.get('ranked') == '1',
+            page_key(request.json_arg('after')), page_key(request.json_arg('before')),
+            request.query.get('sort', 'id'), request.query.get('desc') == '1', request.json_arg('filters'), limit
+        )
+        if result is not None:
+            page, ranked = result
+            result = {'items': page, 'ranked': ranked,
+                      'next': page[-1][0] if len(page) == limit else None}
+        return status, result, headers
+
+    async def count_parts(self, request):
+        status, count, headers = await self.cached(
+            request, 'count_rows', request.query.get('search') or None, request.json_arg('filters'),
+            request.limit_arg(None)
+        )
+        return status, None if count is None else {'count': count}, headers
+
+    async def add_part(self, request):
+        return HTTPStatus.CREATED, {'part': await self.pool.run('add', request.body['values'])}, ()
+
+    async def insert_parts(self, request):
+        inserted, existing = await self.pool.run('insert_many', request.body['rows'],
+                                                 request.body.get('update_existing', True))
+        return {'inserted': inserted, 'existing': existing}
+
+    async def update_fields(self, request):
+        return {'parts': await self.pool.run('update_fields', request.body['ids'], request.body['changes'])}
+
+    async def delete_parts(self, request):
+        await self.pool.run('delete', request.body['ids'])
+        return HTTPStatus.NO_CONTENT, None, ()
+
+    async def changed_parts(self, request):
+        generation, parts, deleted = await self.pool.run('changed_since', request.body['since'],
+                                                         request.body['ids'])
+        return {'generation': generation, 'parts': parts, 'deleted': deleted}
+
+    async def set_min_quantity(self, request):
+        await self.pool.run('set_min_quantity', request.body['ids'], request.body['min_quantity'])
+        return HTTPStatus.NO_CONTENT, None, ()
+
+    async def get_part(self, request):
+        """Запись и ее версия; ETag — версия записи, его передают в If-Match при сохранении"""
+        result = await self.pool.run('get_versioned', request.params[0])
+        if result is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "запчасть не найдена")
+        part, version = result
+        etag = f'"v{version}"'
+        if request.headers.get('if-none-match') == etag:
+            return HTTPStatus.NOT_MODIFIED, None, [('ETag', etag)]
+        return HTTPStatus.OK, {'part': part, 'version': version}, [('ETag', etag)]
+
+    async def update_part(self, request):
+        """Сохраняет запись; с If-Match: "v<версия>" — только если ее никто не изменил (иначе 412)"""
+        if_match = request.headers.get('if-match', '')
+        version = int(if_match.strip('"')[1:]) if if_match.startswith('"v') else None
+        part = await self.pool.run('update', request.params[0], request.body['values'],
+                                   request.body.get('shown_quantity'), version)
+        return {'part': part}
+
+    async def delete_part(self, request):
+        await self.pool.run('delete', [request.params[0]])
+        return HTTPStatus.NO_CONTENT, None, ()
+
+    async def list_movements(self, request):
+        return {'movements': await self.pool.run('movements', request.params[0], request.limit_arg(1000))}
+
+    async def record_movement(self, request):
+        body = request.body
+        part = await self.pool.run('record_movement', request.params[0], body['kind'], body['quantity'],
+                                   body.get('reason', ''))
+        return {'part': part}
+
+    async def stock_at(self, request):
+        return {'stock': await self.pool.run('stock_at', request.params[0], request.query['at'])}
+
+    async def list_suppliers(self, request):
+        status, suppliers, headers = await self.cached(request, 'suppliers')
+        return status, None if suppliers is None else {'suppliers': suppliers}, headers
+
+    async def get_dashboard(self, request):
+        return await self.cached(request, 'dashboard')
+
+    async def get_stats(self, request):
+        """Замеры профилировщика: p50/p95 в мс по операциям (пусто, если сервер запущен без --profile)"""
+        columns = ('operation', 'count', 'p50_ms', 'p95_ms', 'max_ms', 'rows')
+        return {'enabled': PROFILER.enabled, 'stats': [dict(zip(columns, row)) for row in PROFILER.stats()]}
+
+
+async def maintain_periodically(pool):
+    """Раз в MAINTENANCE_INTERVAL секунд — PRAGMA optimize и incremental_vacuum (PartsRepository.maintain)"""
+    while True:
+        await asyncio.sleep(MAINTENANCE_INTERVAL)
+        try:
+            result = await pool.run('maintain')
+        except sqlite3.Error as e:
+            print(f"Обслуживание базы не удалось: {e}")  # База занята: повторим в следующий раз
+            continue
+        if result['freed_pages']:
+            print(f"Обслуживание базы: освобождено страниц {result['freed_pages']} за {result['seconds']:.1f} с")
+
+
+async def serve(path, host=DEFAULT_HOST, port=DEFAULT_PORT, pool_size=POOL_SIZE, on_ready=None):
+    """Открывает базу path и обслуживает запросы, пока процесс не остановят (или задачу не отменят).
+
+    С port=0 система выбирает свободный порт; адрес сервера передается в on_ready(url).
+    """
+    pool = RepositoryPool(path, pool_size)
+    maintenance = None
+    try:
+        server = await asyncio.start_server(PartsServer(pool).handle, host, port)
+        url = f"http://{host}:{server.sockets[0].getsockname()[1]}"
+        print(f"Сервер запчастей: {url}/ (база {path})")
+        if on_ready:
+            on_ready(url)
+        maintenance = asyncio.create_task(maintain_periodically(pool))
+        async with server:
+            await server.serve_forever()
+    finally:
+        if maintenance:
+            maintenance.cancel()
+        pool.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('database', help='файл базы SQLite (создается, если его нет)')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='адрес, на котором принимать соединения')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='порт; 0 — любой свободный')
+    parser.add_argument('--pool', type=int, default=POOL_SIZE, help='соединений с базой')
+    parser.add_argument('--profile', action='store_true',
+                        help='замерять запросы и писать медленные в журнал (см. parts_profiler.py)')
+    args = parser.parse_args(argv)
+    PROFILER.enable(args.profile)
+    try:
+        asyncio.run(serve(args.database, args.host, args.port, args.pool))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Замеры PartsRepository для pytest-benchmark на базах 10 тыс., 100 тыс. и 1 млн строк.
+
+Запуск: pytest tests/bench_repository.py --benchmark-only
+        BENCH_SIZES=10000,100000 pytest tests/bench_repository.py --benchmark-autosave
+Базы строятся один раз на размер (benchmark.synthetic_rows) и живут до конца модуля.
+"""
+import os
+import random
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+from benchmark import PAGE_VIEWS, SEARCH_TERMS, like_search, synthetic_rows  # noqa: E402
+from parts_repository import IMPORT_BATCH_SIZE, PartsRepository  # noqa: E402
+
+SIZES = [int(size) for size in os.environ.get('BENCH_SIZES', '10000,100000,1000000').split(',')]
+
+
+def fill(repository, size):
+    rows = synthetic_rows(size)
+    while True:
+        batch = [row for _, row in zip(range(IMPORT_BATCH_SIZE), rows)]
+        if not batch:
+            break
+        repository.insert_many(batch)
+
+
+@pytest.fixture(scope='module', params=SIZES, ids=lambda size: f'{size}')
+def filled(request, tmp_path_factory):
+    """(репозиторий, число строк) — заполненная база на весь модуль"""
+    path = str(tmp_path_factory.mktemp('bench') / 'bench.db')
+    repository = PartsRepository.open(path)
+    fill(repository, request.param)
+    yield repository, request.param
+    repository.close()
+
+
+def test_insert(benchmark, tmp_path):
+    """Пачка insert_many в базу с уже вставленными строками"""
+    rounds = 20
+    rows = list(synthetic_rows(rounds * IMPORT_BATCH_SIZE))
+    batches = iter(rows[start:start + IMPORT_BATCH_SIZE] for start in range(0, len(rows), IMPORT_BATCH_SIZE))
+    repository = PartsRepository.open(str(tmp_path / 'insert.db'))
+    try:
+        benchmark.pedantic(lambda: repository.insert_many(next(batches)), rounds=rounds)
+    finally:
+        repository.close()
+
+
+@pytest.mark.parametrize('term', SEARCH_TERMS)
+def test_search(benchmark, filled, term):
+    repository, _ = filled
+    benchmark(repository.query_page, term, False)
+
+
+@pytest.mark.parametrize('term', SEARCH_TERMS)
+def test_search_like_baseline(benchmark, filled, term):
+    """Поиск до индекса FTS5: LIKE по всей таблице"""
+    repository, _ = filled
+    benchmark(like_search, repository, term)
+
+
+@pytest.mark.parametrize('sort, descending, filters', PAGE_VIEWS,
+                         ids=[f'{sort}{"-desc" if descending else ""}{"-filter" if filters else ""}'
+                              for sort, descending, filters in PAGE_VIEWS])
+def test_page(benchmark, filled, sort, descending, filters):
+    """Страница таблицы из середины выдачи"""
+    repository, _ = filled
+    after = None
+    for _ in range(10):
+        page, _ = repository.read_page(None, False, after=after, sort=sort, descending=descending, filters=filters)
+        if not page:
+            break
+        after = page[-1][0]
+    benchmark(repository.read_page, None, False, after=after, sort=sort, descending=descending, filters=filters)
+
+
+def test_update(benchmark, filled):
+    repository, size = filled
+    rnd = random.Random(2)
+
+    def update():
+        row = repository.get(rnd.randint(1, size))
+        repository.update(row[0], (row[1], row[2], row[3] + 1, row[4], row[5], row[6], row[7]))
+
+    benchmark(update)
+
+
+def test_update_fields(benchmark, filled):
+    repository, size = filled
+    part_ids = random.Random(3).sample(range(1, size + 1), min(1000, size))
+    benchmark(repository.update_fields, part_ids, {'price': 99.0})
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parts_repository import PartsRepository  # noqa: E402
+
+
+def part(name, part_number, quantity=10, price=100.0, supplier='Bosch', description='',
+         date_added='2024-01-01 12:00:00'):
+    """Значения записи в порядке PartValues"""
+    return (name, part_number, quantity, price, supplier, description, date_added)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'parts.db')
+
+
+@pytest.fixture
+def repository(db_path):
+    repository = PartsRepository.open(db_path)
+    yield repository
+    repository.close()
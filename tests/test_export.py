@@ -0,0 +1,56 @@
+import pytest
+
+from conftest import part
+from parts_export import export_file
+from parts_import import import_file
+from parts_repository import EXPORT_CHUNK_SIZE, PartsRepository
+
+NO_PROGRESS = lambda text, fraction: None  # noqa: E731
+
+# Поля, на которых спотыкаются CSV и Excel: разделители, кавычки, переводы строк, пустые значения
+TRICKY_PARTS = [
+    part('Фильтр; масляный', 'AB-1', quantity=5, price=120.5, description='для "Газели"; дизель'),
+    part('Ремень', 'AB-2', quantity=0, price=0.01, supplier='', description='мног\nострочное "опис"'),
+    part('Свеча, иридиевая', 'CD-3', quantity=12, price=1999.99, supplier='NGK', description='"в кавычках"'),
+    part('Насос\tводяной', 'EF-4', quantity=1, price=4500.0, supplier='Febi', description='\t; , "'),
+]
+
+
+def fields(repository):
+    """Записи по порядку id без id и даты добавления"""
+    return [row[1:7] for row in repository.get_many(range(1, repository.count() + 1))]
+
+
+def test_iter_rows_reads_in_chunks(repository):
+    repository.insert_many([part(f'деталь {i}', f'PN-{i}') for i in range(25)])
+    chunks = list(repository.iter_rows(sort='part_number', descending=True, chunk_size=10))
+    assert [len(rows) for rows in chunks] == [10, 10, 5]
+    numbers = [row[2] for rows in chunks for row in rows]
+    assert numbers == sorted((f'PN-{i}' for i in range(25)), reverse=True)
+
+
+# Выгрузка в несколько пачек iter_rows и файл, где "" встречаются только в многострочном поле
+ROW_SETS = {
+    'chunks': TRICKY_PARTS + [part(f'деталь {i}', f'PN-{i}', quantity=i, price=i / 4)
+                              for i in range(EXPORT_CHUNK_SIZE)],
+    'multiline': [part('Фильтр', 'AB-1', description='мног\nострочное "опис"'), part('Ремень', 'AB-2')],
+}
+
+
+@pytest.mark.parametrize('rows', ROW_SETS.values(), ids=list(ROW_SETS))
+@pytest.mark.parametrize('extension', ['.csv', '.xlsx'])
+def test_export_then_import_keeps_every_field(repository, tmp_path, extension, rows):
+    if extension == '.xlsx':
+        pytest.importorskip('openpyxl')
+    repository.insert_many(rows)
+    path = str(tmp_path / ('parts' + extension))
+    stats = export_file(repository, path, progress=NO_PROGRESS)
+    assert stats['rows'] == len(rows)
+
+    target = PartsRepository.open(str(tmp_path / 'copy.db'))
+    try:
+        result = import_file(target, path, NO_PROGRESS)
+        assert (result['inserted'], result['rejected']) == (len(rows), [])
+        assert fields(target) == fields(repository)
+    finally:
+        target.close()
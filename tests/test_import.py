@@ -0,0 +1,45 @@
+import pytest
+
+from parts_import import clipboard_records, clipboard_text, import_file, parse_part, parse_records
+
+NO_PROGRESS = lambda text, fraction: None  # noqa: E731
+
+
+def imported(repository):
+    """Записи базы по порядку id, без id и даты"""
+    return [row[1:7] for row in repository.get_many(range(1, repository.count() + 1))]
+
+
+@pytest.mark.parametrize('encoding', ['utf-8-sig', 'cp1251'])
+def test_csv_keeps_quoted_fields(repository, tmp_path, encoding):
+    path = tmp_path / 'price.csv'
+    path.write_bytes((
+        'Название;Артикул;Количество;Цена;Поставщик;Описание\r\n'
+        'Фильтр масляный;AB-1;5;120,50;Bosch;"для Газели; дизель"\r\n'
+        '"Ремень; генератора";AB-2;3;99;Mann;"мног\r\nострочное ""опис"""\r\n'
+    ).encode(encoding))
+    stats = import_file(repository, str(path), NO_PROGRESS)
+    assert (stats['inserted'], stats['rejected']) == (2, [])
+    assert imported(repository) == [
+        ('Фильтр масляный', 'AB-1', 5, 120.5, 'Bosch', 'для Газели; дизель'),
+        ('Ремень; генератора', 'AB-2', 3, 99.0, 'Mann', 'мног\r\nострочное "опис"'),
+    ]
+
+
+def test_clipboard_round_trip():
+    rows = [('7', 'Фильтр', 'AB-1', '5', '120.5', 'Bosch', 'многострочное\n"опис"\tс табуляцией', '2024-01-01')]
+    records = parse_records(clipboard_records(clipboard_text(rows)), '2024-02-02 10:00:00', [])
+    assert [values for values, _ in records] == [
+        ('Фильтр', 'AB-1', 5, 120.5, 'Bosch', 'многострочное\n"опис"\tс табуляцией', '2024-02-02 10:00:00')
+    ]
+
+
+@pytest.mark.parametrize('quantity, expected', [('5', 5), ('5.0', 5), (' 7,0 ', 7), (3.0, 3), (4, 4)])
+def test_integral_quantities_are_accepted(quantity, expected):
+    assert parse_part(['Фильтр', 'AB-1', quantity, '1', 'Bosch', ''], '2024-01-01 12:00:00')[2] == expected
+
+
+@pytest.mark.parametrize('quantity', ['5.5', 2.5, '', 'много'])
+def test_fractional_or_missing_quantities_are_rejected(quantity):
+    with pytest.raises(ValueError):
+        parse_part(['Фильтр', 'AB-1', quantity, '1', 'Bosch', ''], '2024-01-01 12:00:00')
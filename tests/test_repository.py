@@ -0,0 +1,243 @@
+import sqlite3
+
+import pytest
+
+from conftest import part
+from parts_backup import restore_snapshot, write_snapshot
+import parts_repository
+from parts_repository import (JOURNAL_MODE_ENV, SCHEMA_MIGRATIONS, ConflictError, PartsRepository, is_network_path,
+                              migrate_schema, replacing_file)
+
+NO_PROGRESS = lambda text, fraction: None  # noqa: E731
+
+
+def fill(repository, count, **fields):
+    repository.insert_many([part(f'деталь {i % 7}', f'PN-{i}', quantity=i % 5, price=10.0 + i, **fields)
+                            for i in range(count)])
+
+
+def walk(repository, sort, descending=False, filters=None, page_size=10):
+    """Все страницы выдачи вперед; возвращает ключи первых строк страниц и id по порядку"""
+    after, first_keys, ids = None, [], []
+    while True:
+        page, _ = repository.read_page(None, False, after, None, sort, descending, filters, page_size)
+        if not page:
+            break
+        first_keys.append(page[0][0])
+        ids += [row[0] for _, row in page]
+        if len(page) < page_size:
+            break
+        after = page[-1][0]
+    return first_keys, ids
+
+
+@pytest.mark.parametrize('sort, descending', [('id', False), ('name', False), ('price', True), ('quantity', True)])
+def test_paging_visits_every_row_once_in_order(repository, sort, descending):
+    fill(repository, 95)
+    _, ids = walk(repository, sort, descending)
+    assert len(ids) == len(set(ids)) == 95
+    column = ['id', 'name', 'part_number', 'quantity', 'price'].index(sort)
+    rows = repository.get_many(ids)
+    by_id = {row[0]: row for row in rows}
+    order = [(by_id[i][column], i) for i in ids]
+    assert order == sorted(order, reverse=descending)
+
+
+def test_paging_backwards_returns_previous_page(repository):
+    fill(repository, 50)
+    first_keys, _ = walk(repository, 'name')
+    page, _ = repository.read_page(None, False, None, first_keys[2], 'name', False, None, 10)
+    expected, _ = repository.read_page(None, False, None, None, 'name', False, None, 10)
+    second, _ = repository.read_page(None, False, expected[-1][0], None, 'name', False, None, 10)
+    assert page == second
+
+
+def test_filters_limit_the_selection(repository):
+    fill(repository, 40)
+    repository.add(part('насос', 'PN-X', supplier='Mann'))
+    _, ids = walk(repository, 'price', filters={'supplier': 'Mann'})
+    assert [row[5] for row in repository.get_many(ids)] == ['Mann']
+    assert repository.count_rows(None, {'quantity_below': 1}) == 8
+
+
+def test_unknown_sort_is_rejected(repository):
+    fill(repository, 3)
+    with pytest.raises(ValueError):
+        repository.query_page(None, False, sort='name IS NOT NULL --')
+    with pytest.raises(ValueError):
+        list(repository.iter_rows(sort='description'))
+
+
+def test_search_matches_word_prefixes(repository):
+    repository.add(part('Фильтр масляный', 'AB-1'))
+    repository.add(part('Ремень генератора', 'AB-2', description='для фильтрации не подходит'))
+    repository.add(part('Свеча зажигания', 'CD-3'))
+    page, ranked = repository.read_page('фил', False)
+    assert ranked
+    assert {row[2] for _, row in page} == {'AB-1', 'AB-2'}
+    page, _ = repository.read_page('фильтр масл', False)
+    assert [row[2] for _, row in page] == ['AB-1']
+
+
+def test_stale_version_raises_conflict(repository):
+    row = repository.add(part('Фильтр', 'AB-1'))
+    _, version = repository.get_versioned(row[0])
+    repository.update(row[0], part('Фильтр воздушный', 'AB-1'), version=version)
+    with pytest.raises(ConflictError) as error:
+        repository.update(row[0], part('Фильтр салона', 'AB-1'), version=version)
+    assert error.value.current[1] == 'Фильтр воздушный'
+    assert repository.get(row[0])[1] == 'Фильтр воздушный'
+
+
+def test_ledger_keeps_quantity_and_history(repository):
+    row = repository.add(part('Фильтр', 'AB-1', quantity=5))
+    repository.record_movement(row[0], 'receipt', 10)
+    repository.record_movement(row[0], 'issue', 3)
+    assert repository.get(row[0])[3] == 12
+    with pytest.raises(ValueError):
+        repository.record_movement(row[0], 'issue', 100)
+    # Изменение остатка в карточке записывается корректировкой
+    repository.update(row[0], part('Фильтр', 'AB-1', quantity=20), shown_quantity=12)
+    assert repository.get(row[0])[3] == 20
+    assert [movement[2] for movement in repository.movements(row[0])] == ['adjustment', 'issue', 'receipt',
+                                                                          'opening']
+    assert repository.stock_at(row[0], '9999-12-31') == 20
+    assert repository.stock_at(row[0], '2000-01-01') == 0
+
+
+def test_quantity_typed_for_null_stock_is_recorded(repository):
+    row = repository.add(part('Фильтр', 'AB-1', quantity=None))
+    repository.update(row[0], part('Фильтр', 'AB-1', quantity=7), shown_quantity=0)
+    assert repository.get(row[0])[3] == 7
+    assert [movement[2] for movement in repository.movements(row[0])] == ['adjustment']
+
+
+def test_triggers_keep_supplier_totals(repository):
+    fill(repository, 30, supplier='Bosch')
+    fill_more = [part(f'насос {i}', f'M-{i}', quantity=2, price=5.5, supplier='Mann') for i in range(5)]
+    repository.insert_many(fill_more)
+    repository.update_fields([1, 2, 3], {'supplier': 'Mann', 'quantity': 7})
+    repository.record_movement(4, 'receipt', 3)
+    repository.delete([5, 6])
+    expected = repository.conn.execute('''
+        SELECT supplier, count(*), sum(quantity), round(sum(quantity * price), 2) FROM parts
+        GROUP BY supplier ORDER BY supplier
+    ''').fetchall()
+    totals = sorted((supplier, parts, quantity, round(value, 2))
+                    for supplier, parts, quantity, value in repository.dashboard()['suppliers'])
+    assert totals == expected
+
+
+def test_low_stock_list_follows_min_quantity(repository):
+    first = repository.add(part('Фильтр', 'AB-1', quantity=2))
+    second = repository.add(part('Ремень', 'AB-2', quantity=20))
+    repository.set_min_quantity([first[0], second[0]], 5)
+    summary = repository.dashboard()
+    assert [row[0] for row in summary['low_stock']] == [first[0]]
+    repository.record_movement(first[0], 'receipt', 10)
+    assert repository.dashboard()['low_stock_count'] == 0
+
+
+def test_changes_from_another_connection(repository, db_path):
+    rows = [repository.add(part(f'деталь {i}', f'PN-{i}')) for i in range(3)]
+    ids = [row[0] for row in rows]
+    since = repository.generation()
+    assert repository.changes(since, ids) is not None  # Первый вызов запоминает data_version
+    assert repository.changes(since, ids) is None
+
+    other = PartsRepository.open(db_path)
+    try:
+        other.update(ids[0], part('изменено', 'PN-0'))
+        other.delete([ids[1]])
+    finally:
+        other.close()
+    counter, changed, deleted = repository.changes(since, ids)
+    assert counter > since
+    assert [row[1] for row in changed] == ['изменено']
+    assert deleted == [ids[1]]
+
+
+def test_migrations_are_applied_once(db_path):
+    repository = PartsRepository.open(db_path)
+    repository.add(part('Фильтр', 'AB-1', quantity=5))
+    migrate_schema(repository.conn)
+    repository.close()
+    repository = PartsRepository.open(db_path)
+    try:
+        assert repository.conn.execute('PRAGMA user_version').fetchone()[0] == len(SCHEMA_MIGRATIONS)
+        assert repository.conn.execute('SELECT count(*) FROM stock_movements').fetchone()[0] == 1
+    finally:
+        repository.close()
+
+
+def test_legacy_database_gets_opening_movements(db_path):
+    conn = sqlite3.connect(db_path)
+    for number, script in enumerate(SCHEMA_MIGRATIONS[:3], start=1):
+        conn.executescript(f'BEGIN; {script} PRAGMA user_version = {number}; COMMIT;')
+    conn.execute("INSERT INTO parts (name, part_number, quantity, price) VALUES ('Фильтр', 'AB-1', 5, 1.0)")
+    conn.commit()
+    conn.close()
+    repository = PartsRepository.open(db_path)
+    try:
+        assert repository.stock_at(1, '9999-12-31') == 5
+    finally:
+        repository.close()
+
+
+def test_snapshot_restores_the_database(repository, tmp_path):
+    fill(repository, 5000)  # Несколько кусков, чтобы второй снимок дописал не все
+    first = write_snapshot(repository, str(tmp_path / 'snapshots'), progress=NO_PROGRESS)
+    repository.update_fields([1], {'quantity': 77})
+    second = write_snapshot(repository, str(tmp_path / 'snapshots'), progress=NO_PROGRESS)
+    assert second['new_chunks'] < second['chunks']
+
+    restored_path = str(tmp_path / 'restored.db')
+    restore_snapshot(first['path'], restored_path, progress=NO_PROGRESS)
+    restored = PartsRepository.open(restored_path)
+    try:
+        assert restored.count() == 5000
+        assert restored.get(1)[3] == 0  # Остаток до изменения
+    finally:
+        restored.close()
+
+
+def test_interrupted_backup_keeps_the_previous_copy(repository, tmp_path):
+    fill(repository, 100)
+    path = str(tmp_path / 'copy.db')
+    repository.backup(path)
+    before = open(path, 'rb').read()
+
+    def interrupt(text, fraction):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        repository.backup(path, interrupt)
+    assert open(path, 'rb').read() == before
+    assert not [p.name for p in tmp_path.iterdir() if '.part' in p.name]
+
+    with replacing_file(path) as partial_path:
+        open(partial_path, 'w').close()
+    assert open(path, 'rb').read() == b''
+
+
+def test_network_database_uses_rollback_journal(db_path, monkeypatch):
+    assert is_network_path('//server/share/parts.db')
+    assert not is_network_path(db_path)
+    monkeypatch.setattr(parts_repository, 'is_network_path', lambda path: True)
+    repository = PartsRepository.open(db_path)
+    try:
+        assert repository.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+        repository.add(part('Фильтр', 'AB-1'))
+        assert repository.count() == 1
+    finally:
+        repository.close()
+
+    monkeypatch.setenv(JOURNAL_MODE_ENV, 'wal')
+    repository = PartsRepository.open(db_path)
+    try:
+        assert repository.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    finally:
+        repository.close()
+    monkeypatch.setenv(JOURNAL_MODE_ENV, 'memory')
+    with pytest.raises(ValueError):
+        PartsRepository.open(db_path)
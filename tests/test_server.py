@@ -0,0 +1,137 @@
+import asyncio
+import http.client
+import json
+import sqlite3
+import threading
+from urllib.parse import urlsplit
+
+import pytest
+
+from conftest import part
+from parts_client import RemoteRepository
+from parts_repository import ConflictError
+from parts_server import MAX_PAGE_SIZE, serve
+
+
+@pytest.fixture
+def server_url(db_path):
+    """Адрес сервера на свободном порту; сервер работает в своем потоке со своим циклом asyncio"""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    urls = []
+
+    def started(url):
+        urls.append(url)
+        ready.set()
+
+    task = loop.create_task(serve(db_path, port=0, pool_size=2, on_ready=started))
+
+    def run():
+        try:
+            loop.run_until_complete(task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    assert ready.wait(10), "сервер не запустился"
+    yield urls[0]
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join(10)
+
+
+@pytest.fixture
+def remote(server_url):
+    repository = RemoteRepository.open(server_url)
+    yield repository
+    repository.close()
+
+
+def raw_get(url, path, headers=None):
+    """(статус, заголовки, JSON) ответа на GET без кэша RemoteRepository"""
+    connection = http.client.HTTPConnection(urlsplit(url).netloc, timeout=10)
+    try:
+        connection.request('GET', path, headers=headers or {})
+        response = connection.getresponse()
+        payload = response.read()
+        return response.status, dict(response.getheaders()), json.loads(payload) if payload else None
+    finally:
+        connection.close()
+
+
+def test_paging_matches_the_local_repository(remote, repository):
+    remote.insert_many([part(f'деталь {i % 7}', f'PN-{i}', price=10.0 + i) for i in range(45)])
+    after, remote_ids = None, []
+    while True:
+        page, _ = remote.read_page(None, False, after, None, 'name', True, None, 10)
+        remote_ids += [row[0] for _, row in page]
+        if len(page) < 10:
+            break
+        after = page[-1][0]
+    local_ids = [row[0] for rows in repository.iter_rows(sort='name', descending=True) for row in rows]
+    assert remote_ids == local_ids
+    assert remote.count_rows(None, {'price_min': 50}) == repository.count_rows(None, {'price_min': 50})
+
+
+def test_unchanged_reads_get_304(remote, server_url):
+    remote.add(part('Фильтр', 'AB-1'))
+    status, headers, body = raw_get(server_url, '/parts')
+    assert status == 200 and len(body['items']) == 1
+    status, _, body = raw_get(server_url, '/parts', {'If-None-Match': headers['ETag']})
+    assert (status, body) == (304, None)
+
+    first = remote.request('GET', '/suppliers')
+    assert remote.request('GET', '/suppliers') is first  # Ответ 304 отдан из кэша клиента
+    remote.add(part('Ремень', 'AB-2', supplier='Mann'))
+    assert remote.suppliers() == ['Bosch', 'Mann']
+
+
+def test_stale_version_gets_412(remote):
+    row = remote.add(part('Фильтр', 'AB-1'))
+    _, version = remote.get_versioned(row[0])
+    remote.update(row[0], part('Фильтр воздушный', 'AB-1'), version=version)
+    with pytest.raises(ConflictError) as error:
+        remote.update(row[0], part('Фильтр салона', 'AB-1'), version=version)
+    assert error.value.current[1] == 'Фильтр воздушный'
+
+
+def test_duplicate_part_number_gets_409(remote):
+    remote.add(part('Фильтр', 'AB-1'))
+    with pytest.raises(sqlite3.IntegrityError):
+        remote.add(part('Ремень', 'AB-1'))
+
+
+def test_bad_arguments_get_400(remote, server_url):
+    with pytest.raises(ValueError):
+        remote.read_page(None, False, sort='name IS NOT NULL --')
+    with pytest.raises(ValueError):
+        remote.read_page(None, False, filters={'color': 'red'})  # Нет такого фильтра
+    assert raw_get(server_url, '/parts?filters=%7Bnot-json')[0] == 400
+
+
+def test_limit_is_clamped(remote, server_url):
+    remote.insert_many([part(f'деталь {i}', f'PN-{i}') for i in range(5)])
+    for limit in (-1, 0):
+        assert len(raw_get(server_url, f'/parts?limit={limit}')[2]['items']) == 1
+    assert raw_get(server_url, f'/parts?limit={MAX_PAGE_SIZE * 10}')[2]['next'] is None
+    assert raw_get(server_url, '/parts/count?limit=-1')[2]['count'] == 1
+
+
+def test_changes_from_another_client(remote, server_url):
+    rows = [remote.add(part(f'деталь {i}', f'PN-{i}')) for i in range(3)]
+    ids = [row[0] for row in rows]
+    since = remote.generation()
+    assert remote.changes(since, ids) is not None
+    assert remote.changes(since, ids) is None
+
+    other = RemoteRepository.open(server_url)
+    try:
+        other.record_movement(ids[0], 'receipt', 5)
+        other.delete([ids[1]])
+    finally:
+        other.close()
+    _, changed, deleted = remote.changes(since, ids)
+    assert [(row[0], row[3]) for row in changed] == [(ids[0], 15)]
+    assert deleted == [ids[1]]